@@ -0,0 +1,83 @@
+"""Nearest-courier lookups and batch matching on the in-memory grid index.
+
+Couriers are spread over a ~40 x 40 km city, lookups and orders are uniform
+over the same area. No database is involved.
+
+    python bench/couriers.py --couriers 5000 --lookups 20000
+"""
+import argparse
+import random
+import time
+
+import harness
+
+
+def city_point(rng: random.Random, center=(55.75, 37.62), spread=(0.18, 0.3)):
+    from delivery.domain.geo import Point
+    return Point(center[0] + rng.uniform(-spread[0], spread[0]), center[1] + rng.uniform(-spread[1], spread[1]))
+
+
+def timings(fn, repeat: int) -> list[float]:
+    result = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        result.append(time.perf_counter() - started_at)
+    return result
+
+
+def describe(name: str, values: list[float]):
+    us = [x * 1e6 for x in values]
+    print(f'{name:<32} p50 {harness.percentile(us, 50):>9.1f} us  p99 {harness.percentile(us, 99):>9.1f} us')
+
+
+def lookup(index, point, k: int, busy=()):
+    return index.nearest(point.latitude, point.longitude, k, 10.0, busy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Courier index and matching benchmark')
+    parser.add_argument('--couriers', type=int, default=5000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--busy', type=float, default=0.3, help='share of couriers already on a delivery')
+    parser.add_argument('--cell', type=float, default=0.01, help='grid cell size in degrees')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    from delivery.application.matching import match_greedy, match_optimal
+    from delivery.infra.spatial import GridIndex
+
+    rng = random.Random(args.seed)
+    index = GridIndex(args.cell)
+    couriers = [(f'courier-{i}', city_point(rng)) for i in range(args.couriers)]
+
+    started_at = time.perf_counter()
+    for key, point in couriers:
+        index.update(key, point.latitude, point.longitude)
+    print(f'indexed {args.couriers} couriers in {(time.perf_counter() - started_at) * 1000:.1f} ms')
+
+    moves = [(key, city_point(rng)) for key, _ in couriers]
+    started_at = time.perf_counter()
+    for key, point in moves:
+        index.update(key, point.latitude, point.longitude)
+    print(f'position update {(time.perf_counter() - started_at) / len(moves) * 1e6:.2f} us each')
+
+    busy = {key for key, _ in rng.sample(couriers, int(args.couriers * args.busy))}
+    queries = [city_point(rng) for _ in range(args.lookups)]
+    for k in (1, 5):
+        it = iter(queries)
+        describe(f'nearest k={k}', timings(lambda: lookup(index, next(it), k), args.lookups // 2))
+        describe(f'nearest k={k}, {args.busy:.0%} busy', timings(lambda: lookup(index, next(it), k, busy),
+                                                                 args.lookups // 2))
+
+    for size, strategy in ((20, match_optimal), (20, match_greedy), (200, match_greedy), (1000, match_greedy)):
+        orders = [(f'order-{i}', city_point(rng)) for i in range(size)]
+        values = timings(lambda: strategy(orders, index, busy, 5, 10.0), 5)
+        assigned = strategy(orders, index, busy, 5, 10.0)
+        total = sum(km for _, km in assigned.values())
+        print(f'{strategy.__name__:<14} {size:>5} orders  {min(values) * 1000:>8.2f} ms  '
+              f'assigned {len(assigned):>5}  total {total:>8.1f} km')
+
+
+if __name__ == '__main__':
+    main()
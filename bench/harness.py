@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StatementCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+        def count(*args):
+            self.count += 1
+
+
+@dataclass
+class PhaseResult:
+    name: str
+    requests: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    latencies: list[float] = field(default_factory=list, repr=False)
+    statements: int = 0
+    rss_before: float = 0.0
+    rss_after: float = 0.0
+    extra: dict = field(default_factory=dict)
+
+    def summary(self) -> dict:
+        ms = [x * 1000 for x in self.latencies]
+        return {'requests': self.requests,
+                'errors': self.errors,
+                'rps': round(self.requests / self.seconds, 1) if self.seconds else 0.0,
+                'p50_ms': round(percentile(ms, 50), 2),
+                'p90_ms': round(percentile(ms, 90), 2),
+                'p99_ms': round(percentile(ms, 99), 2),
+                'max_ms': round(max(ms, default=0.0), 2),
+                'mean_ms': round(statistics.fmean(ms), 2) if ms else 0.0,
+                'statements_per_request': round(self.statements / self.requests, 2) if self.requests else 0.0,
+                'rss_mb': round(self.rss_after, 1),
+                'rss_delta_mb': round(self.rss_after - self.rss_before, 1),
+                **self.extra}
+
+
+async def run_phase(name: str,
+                    operation: Callable[[int], Awaitable[bool]],
+                    requests: int,
+                    concurrency: int,
+                    counter: StatementCounter) -> PhaseResult:
+    result = PhaseResult(name, rss_before=rss_mb())
+    queue = iter(range(requests))
+    statements_before = counter.count
+
+    async def worker():
+        for i in queue:
+            started_at = time.perf_counter()
+            try:
+                ok = await operation(i)
+            except Exception:
+                ok = False
+            result.latencies.append(time.perf_counter() - started_at)
+            result.requests += 1
+            if not ok:
+                result.errors += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.seconds = time.perf_counter() - started_at
+    result.statements = counter.count - statements_before
+    result.rss_after = rss_mb()
+    return result
+
+
+class AsgiWebSocket:
+    """Minimal in-process WebSocket client speaking the ASGI protocol directly."""
+
+    def __init__(self, app, path: str):
+        self._app = app
+        self._path = path
+        self._incoming: asyncio.Queue = asyncio.Queue()
+        self._outgoing: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self.closed = asyncio.Event()
+
+    async def connect(self, timeout: float = 5.0):
+        scope = {'type': 'websocket', 'asgi': {'version': '3.0'}, 'scheme': 'ws',
+                 'path': self._path, 'raw_path': self._path.encode(), 'root_path': '',
+                 'query_string': b'', 'headers': [], 'subprotocols': [],
+                 'client': ('127.0.0.1', 0), 'server': ('bench', 80)}
+        self._task = asyncio.create_task(self._app(scope, self._incoming.get, self._on_send))
+        await self._incoming.put({'type': 'websocket.connect'})
+        try:
+            message = await asyncio.wait_for(self._outgoing.get(), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            raise
+        if message['type'] != 'websocket.accept':
+            raise ConnectionError(f'WebSocket {self._path} was rejected: {message}')
+
+    async def _on_send(self, message):
+        if message['type'] == 'websocket.send':
+            text = message.get('text')
+            if text == 'ping':
+                await self._incoming.put({'type': 'websocket.receive', 'text': 'pong'})
+            else:
+                await self.messages.put((time.perf_counter(), text))
+        else:
+            if message['type'] == 'websocket.close':
+                self.closed.set()
+                await self._incoming.put({'type': 'websocket.disconnect', 'code': message.get('code', 1000)})
+            await self._outgoing.put(message)
+
+    async def close(self):
+        await self._incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        if self._task is not None:
+            _, pending = await asyncio.wait({self._task}, timeout=2.0)
+            for task in pending:
+                task.cancel()
+
+
+@asynccontextmanager
+async def running_app():
+    import httpx
+    from main import app
+    from db_config import engine
+
+    counter = StatementCounter()
+    counter.install(engine)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=30) as client:
+            yield app, client, counter
+
+
+def environment() -> dict:
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    regressions = []
+    for phase, current in results['phases'].items():
+        previous = baseline.get('phases', {}).get(phase)
+        if previous is None:
+            continue
+        for metric, higher_is_better in (('rps', True), ('p99_ms', False), ('statements_per_request', False)):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = -change if higher_is_better else change
+            marker = 'REGRESSION' if worse > max_regression else ''
+            print(f'{phase:<14} {metric:<24} {old:>10} -> {new:<10} {change:+7.1f}% {marker}')
+            if marker:
+                regressions.append(f'{phase}.{metric}')
+    return regressions
+
+
+def dump(path: str, data: dict):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
@@ -0,0 +1,259 @@
+"""Load benchmark for the order lifecycle.
+
+Boots ``main.app`` in-process over the httpx ASGI transport against the
+Postgres configured through the usual ``POSTGRES_*`` / ``DB_DOMAIN`` variables,
+seeds bench users, then runs one phase per scenario and prints req/s, latency
+percentiles, DB statements per request and process memory.
+
+    python bench/lifecycle.py --orders 500 --concurrency 16 --output bench/results.json
+    python bench/lifecycle.py --compare bench/baseline.json
+
+Bench rows are created next to existing data and are never removed, point the
+variables at a scratch database.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+import uuid
+
+from harness import AsgiWebSocket, PhaseResult, compare, dump, environment, rss_mb, run_phase, running_app
+
+BENCH_PASSWORD = 'bench'
+BENCH_ADMIN = 'bench_admin'
+BENCH_CATEGORY = 'bench-category'
+TRANSITIONS = ('begin', 'ready', 'delivery', 'complete')
+
+
+async def seed(customers: int) -> tuple[list[str], str]:
+    from sqlalchemy import select
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    from db_config import SessionInst
+    from models import Category, Product, User
+    from user.application.utils import crypt_context
+
+    hashed = crypt_context.hash(BENCH_PASSWORD)
+    users = [(BENCH_ADMIN, 1)] + [(f'bench_customer_{i}', 3) for i in range(customers)]
+
+    async with SessionInst() as session:
+        await session.execute(pg_insert(User).on_conflict_do_nothing(),
+                              [{'id': uuid.uuid5(uuid.NAMESPACE_OID, name), 'username': name,
+                                'password': hashed, 'role_id': role, 'is_active': True}
+                               for name, role in users])
+
+        category_id = uuid.uuid5(uuid.NAMESPACE_OID, BENCH_CATEGORY)
+        await session.execute(pg_insert(Category).on_conflict_do_nothing(),
+                              [{'id': category_id, 'category_name': BENCH_CATEGORY}])
+        await session.execute(pg_insert(Product).on_conflict_do_nothing(),
+                              [{'id': uuid.uuid5(category_id, str(i)), 'product_name': f'bench product {i}',
+                                'category_id': category_id, 'price': 100 + i} for i in range(20)])
+        await session.commit()
+
+        products = (await session.execute(select(Product.id).where(Product.category_id == category_id))).scalars()
+        return [str(x) for x in products], BENCH_CATEGORY
+
+
+async def login(client, username: str) -> dict:
+    res = await client.request('GET', '/token', data={'username': username, 'password': BENCH_PASSWORD})
+    res.raise_for_status()
+    return {'Authorization': f'Bearer {res.json()["access_token"]}'}
+
+
+def order_body(rnd: random.Random, customer: str, products: list[str]) -> dict:
+    items = rnd.sample(products, rnd.randint(1, 3))
+    return {'customer_name': customer,
+            'address': f'bench street {rnd.randint(1, 999)}',
+            'items': [{'id': x, 'quantity': rnd.randint(1, 4)} for x in items]}
+
+
+async def websocket_phase(app, client, counter, admin: dict, products: list[str], sockets: int,
+                          orders: int, rnd: random.Random) -> PhaseResult:
+    order_ids = []
+    for _ in range(orders):
+        res = await client.post('/orders/new', headers=admin, json=order_body(rnd, BENCH_ADMIN, products))
+        order_ids.append(res.json()['order_id'])
+
+    result = PhaseResult('websocket', rss_before=rss_mb())
+    watchers: dict[str, list[AsgiWebSocket]] = {x: [] for x in order_ids}
+    connected = failed = 0
+    connect_started_at = time.perf_counter()
+    for i in range(sockets):
+        order_id = order_ids[i % orders]
+        ws = AsgiWebSocket(app, f'/orders/{order_id}/ws')
+        try:
+            await ws.connect()
+            await asyncio.wait_for(ws.messages.get(), 5.0)
+        except (asyncio.TimeoutError, ConnectionError):
+            failed = sockets - connected
+            await ws.close()
+            break
+        watchers[order_id].append(ws)
+        connected += 1
+    connected_rss = rss_mb()
+    connect_seconds = time.perf_counter() - connect_started_at
+
+    missed = 0
+    statements_before = counter.count
+    started_at = time.perf_counter()
+    for action in TRANSITIONS if not failed else ():
+        for order_id, sockets_of_order in watchers.items():
+            sent_at = time.perf_counter()
+            res = await client.post(f'/orders/{order_id}/{action}', headers=admin)
+            result.requests += 1
+            if res.status_code != 204:
+                result.errors += 1
+                continue
+            for ws in sockets_of_order:
+                try:
+                    received_at, _ = await asyncio.wait_for(ws.messages.get(), 5.0)
+                except asyncio.TimeoutError:
+                    missed += 1
+                    continue
+                result.latencies.append(received_at - sent_at)
+    result.seconds = time.perf_counter() - started_at
+    result.statements = counter.count - statements_before
+    result.rss_after = rss_mb()
+
+    await asyncio.gather(*(ws.close() for group in watchers.values() for ws in group))
+
+    result.extra = {'sockets': connected,
+                    'failed_connects': failed,
+                    'pushes': len(result.latencies),
+                    'missed_pushes': missed,
+                    'connect_ms_per_socket': round(connect_seconds / sockets * 1000, 2),
+                    'kb_per_socket': round((connected_rss - result.rss_before) * 1024 / connected, 1) if connected else 0.0}
+    return result
+
+
+async def run(args) -> dict:
+    rnd = random.Random(args.seed)
+    phases: dict[str, dict] = {}
+
+    def report(result: PhaseResult):
+        summary = result.summary()
+        phases[result.name] = summary
+        print(f'{result.name:<12} {summary["requests"]:>6} req {summary["errors"]:>4} err '
+              f'{summary["rps"]:>9} req/s  p50 {summary["p50_ms"]:>8} ms  p90 {summary["p90_ms"]:>8} ms  '
+              f'p99 {summary["p99_ms"]:>8} ms  {summary["statements_per_request"]:>6} stmt/req  '
+              f'{summary["rss_mb"]:>7} MB')
+        if result.extra:
+            print(' ' * 12, ', '.join(f'{k} {v}' for k, v in result.extra.items()))
+
+    products, category = await seed(args.customers)
+    customers = [f'bench_customer_{i}' for i in range(args.customers)]
+
+    async with running_app() as (app, client, counter):
+        admin = await login(client, BENCH_ADMIN)
+        headers = {x: await login(client, x) for x in customers}
+
+        async def token(i):
+            res = await client.request('GET', '/token', data={'username': customers[i % len(customers)],
+                                                              'password': BENCH_PASSWORD})
+            return res.status_code == 200
+
+        report(await run_phase('token', token, args.token_requests, min(args.concurrency, 4), counter))
+
+        created = []
+
+        async def create(i):
+            customer = customers[i % len(customers)]
+            res = await client.post('/orders/new', headers=headers[customer],
+                                    json=order_body(rnd, customer, products))
+            if res.status_code == 201:
+                created.append(res.json()['order_id'])
+            return res.status_code == 201
+
+        report(await run_phase('create', create, args.orders, args.concurrency, counter))
+
+        cancelled = created[::10]
+        lifecycle = [x for x in created if x not in set(cancelled)]
+        for action in TRANSITIONS:
+            async def transit(i, action=action):
+                res = await client.post(f'/orders/{lifecycle[i]}/{action}', headers=admin)
+                return res.status_code == 204
+
+            report(await run_phase(action, transit, len(lifecycle), args.concurrency, counter))
+
+        async def cancel(i):
+            res = await client.post(f'/orders/{cancelled[i]}/cancel', headers=admin)
+            return res.status_code == 204
+
+        report(await run_phase('cancel', cancel, len(cancelled), args.concurrency, counter))
+
+        async def my(i):
+            res = await client.get('/orders/my', headers=headers[customers[i % len(customers)]])
+            return res.status_code == 200
+
+        report(await run_phase('my', my, args.reads, args.concurrency, counter))
+
+        cursors = [None]
+        while len(cursors) < args.pages:
+            res = await client.get('/orders/all', headers=admin,
+                                   params={'page_size': args.page_size, **({'cursor': cursors[-1]} if cursors[-1] else {})})
+            next_cursor = res.json().get('next_cursor')
+            if not next_cursor:
+                break
+            cursors.append(next_cursor)
+
+        async def all_orders(i):
+            cursor = cursors[i % len(cursors)]
+            res = await client.get('/orders/all', headers=admin,
+                                   params={'page_size': args.page_size, **({'cursor': cursor} if cursor else {})})
+            return res.status_code == 200
+
+        result = await run_phase('all', all_orders, args.reads, args.concurrency, counter)
+        result.extra = {'page_depth': len(cursors)}
+        report(result)
+
+        async def by_category(i):
+            res = await client.get(f'/category/{category}')
+            return res.status_code == 200
+
+        report(await run_phase('category', by_category, args.reads, args.concurrency, counter))
+
+        if args.sockets:
+            report(await websocket_phase(app, client, counter, admin, products, args.sockets,
+                                         min(args.ws_orders, args.sockets), rnd))
+
+    return {'environment': environment(), 'config': vars(args), 'phases': phases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Order lifecycle load benchmark')
+    parser.add_argument('--orders', type=int, default=500, help='orders created and driven through the lifecycle')
+    parser.add_argument('--reads', type=int, default=1000, help='requests per read scenario')
+    parser.add_argument('--token-requests', type=int, default=50)
+    parser.add_argument('--customers', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=20, help='cursor depth visited by the /orders/all scenario')
+    parser.add_argument('--sockets', type=int, default=200, help='concurrent WebSockets, 0 to skip')
+    parser.add_argument('--ws-orders', type=int, default=20, help='orders the WebSockets are spread over')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON, e.g. to refresh bench/baseline.json')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help='percent a metric may get worse before --compare fails')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = asyncio.run(run(args))
+
+    if args.output:
+        dump(args.output, results)
+
+    if args.compare:
+        import json
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f'Regressed: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
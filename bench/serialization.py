@@ -0,0 +1,120 @@
+"""Compares the ORM + pydantic response path with the row + orjson one for order pages.
+
+The ORM path mirrors what FastAPI does for ``response_model=OrderPagesResponse``:
+validate ``Order`` objects with ``from_attributes``, dump them in json mode and
+render with ``json.dumps``. The row path is what ``/orders/all`` serves now.
+
+    python bench/serialization.py --rows 1000
+    python bench/serialization.py --rows 1000 --db   # include fetching from Postgres
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import harness  # noqa: F401, puts src on sys.path
+
+
+def synthetic(rows: int):
+    from models import DeliveryInfo, Order
+
+    now = datetime.now(timezone.utc)
+    objects, tuples = [], []
+    for i in range(rows):
+        data = {'total_price': 640.0 + i,
+                'products': [{'product_id': str(uuid.uuid4()), 'name': 'Philadelphia with Salmon',
+                              'quantity': 2, 'price': 320.0 + i}]}
+        delivery = DeliveryInfo(id=uuid.uuid4(), address=f'bench street {i}', courier_id=None)
+        order = Order(id=uuid.uuid4(), customer_name='bench', data=data, order_status='CREATED',
+                      created_at=now - timedelta(seconds=i), updated_at=now, version=0,
+                      delivery_info=delivery)
+        objects.append(order)
+        tuples.append((order.id, order.order_status, order.data, order.created_at, order.updated_at,
+                       delivery.address, delivery.id, delivery.courier_id, order.customer_name, order.version))
+    return objects, tuples
+
+
+def orm_path(adapter, orders) -> bytes:
+    content = adapter.validate_python({'orders': orders, 'has_more': False, 'next_cursor': None},
+                                      from_attributes=True)
+    return json.dumps(adapter.dump_python(content, mode='json'),
+                      ensure_ascii=False, allow_nan=False, indent=None, separators=(',', ':')).encode()
+
+
+def row_path(encoder, rows) -> bytes:
+    from api.encoders import json_response
+
+    return json_response({'orders': encoder.build_many(rows), 'has_more': False, 'next_cursor': None}).body
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started_at)
+    return best
+
+
+async def fetch(rows: int):
+    from sqlalchemy import select
+
+    from db_config import SessionInst, engine
+    from models import Order
+    from orders.application.query import ORDER_COLUMNS
+
+    async def load_orm():
+        async with SessionInst() as session:
+            return (await session.execute(select(Order).limit(rows))).scalars().all()
+
+    async def load_rows():
+        async with SessionInst() as session:
+            return (await session.execute(select(*ORDER_COLUMNS).join(Order.delivery_info).limit(rows))).all()
+
+    await load_orm(), await load_rows()
+    timings = {}
+    for name, load in (('orm', load_orm), ('rows', load_rows)):
+        started_at = time.perf_counter()
+        for _ in range(5):
+            result = await load()
+        timings[name] = ((time.perf_counter() - started_at) / 5, result)
+    await engine.dispose()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Order list serialization benchmark')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', action='store_true', help='also fetch the rows from Postgres')
+    args = parser.parse_args()
+
+    from pydantic import TypeAdapter
+
+    from api.routers.orders import order_encoder
+    from api.schemas import OrderPagesResponse
+
+    adapter = TypeAdapter(OrderPagesResponse)
+    objects, tuples = synthetic(args.rows)
+    assert json.loads(orm_path(adapter, objects)) == json.loads(row_path(order_encoder, tuples))
+
+    orm = timeit(lambda: orm_path(adapter, objects), args.repeat)
+    rows = timeit(lambda: row_path(order_encoder, tuples), args.repeat)
+    print(f'serialize {args.rows} orders: orm+pydantic {orm * 1000:.2f} ms, rows+orjson {rows * 1000:.2f} ms, '
+          f'x{orm / rows:.1f}')
+
+    if args.db:
+        import logging
+        logging.disable(logging.INFO)
+        timings = asyncio.run(fetch(args.rows))
+        (orm_fetch, orm_objects), (rows_fetch, row_tuples) = timings['orm'], timings['rows']
+        orm_total = orm_fetch + timeit(lambda: orm_path(adapter, orm_objects), args.repeat)
+        rows_total = rows_fetch + timeit(lambda: row_path(order_encoder, row_tuples), args.repeat)
+        print(f'fetch+serialize {len(row_tuples)} orders: orm+pydantic {orm_total * 1000:.2f} ms, '
+              f'rows+orjson {rows_total * 1000:.2f} ms, x{orm_total / rows_total:.1f}')
+
+
+if __name__ == '__main__':
+    main()
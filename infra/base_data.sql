@@ -9,4 +9,5 @@ values ('ce69cbac-3fe4-4e9c-b9c7-d9f148f4c4f9', 'Philadelphia with Salmon',	'd70
 
 insert into users (user_id, username, user_password, role_id, is_active)
 values ('d91e29d1-5019-471b-ad69-b7f8641cef59', 'artem', '$2b$12$ym5CRNR39iSptUcdzpFKQO2.yvB.DstG.4QCHr5WPIIW2KL/vafIy', 1, true), -- password 123
-	   ('b2dd8336-cc9c-457a-aa4f-f0be05a0ad96', 'customer_1', '$2b$12$ym5CRNR39iSptUcdzpFKQO2.yvB.DstG.4QCHr5WPIIW2KL/vafIy', 3, true); -- password 123
\ No newline at end of file
+	   ('b2dd8336-cc9c-457a-aa4f-f0be05a0ad96', 'customer_1', '$2b$12$ym5CRNR39iSptUcdzpFKQO2.yvB.DstG.4QCHr5WPIIW2KL/vafIy', 3, true), -- password 123
+	   ('5b0c3e4a-3f0e-4d8c-9a57-0f3b2f4c9e61', 'courier_1', '$2b$12$ym5CRNR39iSptUcdzpFKQO2.yvB.DstG.4QCHr5WPIIW2KL/vafIy', 4, true); -- password 123
\ No newline at end of file
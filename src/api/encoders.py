@@ -0,0 +1,53 @@
+from typing import Any, Sequence
+from uuid import UUID
+
+import orjson
+from fastapi import Response
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def _default(obj: Any):
+    # asyncpg returns its own UUID subclass, orjson only knows uuid.UUID itself
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError
+
+
+class RowEncoder:
+    """Turns result rows into response dicts without ORM or pydantic objects.
+
+    ``fields`` names the row positions in order, dotted names nest into a sub
+    object, e.g. ``delivery_info.address``, keys keep the order of first
+    appearance. The layout is resolved once, so building a dict per row is a
+    comprehension over tuple indexes.
+    """
+
+    def __init__(self, fields: Sequence[str]):
+        self.fields = tuple(fields)
+        self._layout: dict[str, int | dict[str, int]] = {}
+        for i, name in enumerate(self.fields):
+            if '.' in name:
+                parent, child = name.split('.', 1)
+                self._layout.setdefault(parent, {})[child] = i
+            else:
+                self._layout[name] = i
+        self._items = tuple((name, x if isinstance(x, int) else tuple(x.items()))
+                            for name, x in self._layout.items())
+
+    def build(self, row: Sequence[Any]) -> dict:
+        return {name: row[x] if x.__class__ is int else {child: row[i] for child, i in x}
+                for name, x in self._items}
+
+    def build_many(self, rows: Sequence[Sequence[Any]]) -> list[dict]:
+        return [self.build(x) for x in rows]
+
+
+def dump_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def json_response(content: Any, status_code: int = 200) -> Response:
+    return Response(dump_json(content),
+                    status_code=status_code,
+                    media_type='application/json')
@@ -0,0 +1,42 @@
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query, status
+
+from api.routing import InstrumentedRoute
+from api.schemas import CourierAssignmentsResponse, NearestCourierResponse
+from delivery.application.service import COURIER_MAX_DISTANCE_KM, CourierAssignmentService
+from delivery.domain.schemas import CourierPositionReq
+from exceptions import NoPermissionByRole
+from user.application.service import UserService
+from user.domain.entity import AuthorizedUserEntity
+
+router = APIRouter(prefix='/couriers', route_class=InstrumentedRoute)
+
+
+@router.put('/me/position', status_code=status.HTTP_204_NO_CONTENT)
+async def report_position(position: CourierPositionReq,
+                          user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
+                          assignment_service: CourierAssignmentService = Depends()):
+    if not user.verify_courier_access():
+        raise NoPermissionByRole
+
+    await assignment_service.report_position(UUID(user.id), position.latitude, position.longitude,
+                                             position.available)
+
+
+@router.get('/nearest', response_model=list[NearestCourierResponse])
+async def nearest_couriers(latitude: float = Query(ge=-90, le=90),
+                           longitude: float = Query(ge=-180, le=180),
+                           limit: int = Query(5, ge=1, le=50),
+                           max_km: float = Query(COURIER_MAX_DISTANCE_KM, gt=0),
+                           user: AuthorizedUserEntity = Depends(UserService.get_user_from_token)):
+    UserService.is_rw_access(user)
+    return CourierAssignmentService.nearest(latitude, longitude, limit, max_km)
+
+
+@router.post('/assignments', response_model=CourierAssignmentsResponse)
+async def assign_couriers(user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
+                          assignment_service: CourierAssignmentService = Depends()):
+    UserService.is_rw_access(user)
+    assignments = await assignment_service.assign_ready_orders()
+    return {'assignments': assignments}
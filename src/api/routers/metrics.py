@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from api.routing import InstrumentedRoute
+from shared.infra.metrics import metrics_registry
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+
+@router.get('/metrics', include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
@@ -1,20 +1,41 @@
-from fastapi import APIRouter, Depends, WebSocket, status
-import asyncio
+import time
+from datetime import datetime, timedelta, timezone
 
-from orders.application.query import OrderQueries
+from fastapi import APIRouter, Depends, Query, Response, WebSocket, status
+
+from orders.application.query import OrderQueries, ORDERS_PAGE_SIZE, ORDERS_MAX_PAGE_SIZE, TOP_PRODUCTS_MAX_LIMIT, \
+    TIMELINE_COLUMNS
 from orders.infra.repository import OrderRepository
-from api.schemas import OrderResponse, UserOrderResponse, OrderPagesResponse
-from orders.application.utils import check_new_events
+from orders.infra.notifier import order_connections
+from api.encoders import RowEncoder, json_response
+from api.routing import InstrumentedRoute
+from api.schemas import OrderResponse, UserOrderPagesResponse, OrderPagesResponse, OrderBatchResponse, \
+    TopProductsResponse, OrderTimelineResponse, OrderTransitionsResponse
+from orders.application.utils import encode_cursor, decode_cursor
 from exceptions import OrderNotFoundException, NoPermissionByRole
 from user.application.service import UserService
 from user.domain.entity import AuthorizedUserEntity
 
 from orders.application.commands import OrderCommands
-from orders.domain.schemas import OrderReq, OrderUpdate
+from orders.domain.schemas import OrderReq, OrderUpdate, OrderTransitionReq
+from orders.domain.value_obj import ACTIVE_STATUSES, Status
 
 from uuid import UUID
 
-router = APIRouter(prefix='/orders')
+from db_config import SessionInst
+from shared.infra.connections import Tracker
+
+router = APIRouter(prefix='/orders', route_class=InstrumentedRoute)
+
+PRODUCT_STATS_WINDOW = timedelta(days=30)
+
+user_order_encoder = RowEncoder(['id', 'order_status', 'data', 'created_at', 'updated_at',
+                                 'delivery_info.address'])
+order_encoder = RowEncoder(['id', 'order_status', 'data', 'created_at', 'updated_at',
+                            'delivery_info.address', 'delivery_info.id', 'delivery_info.courier_id',
+                            'customer_name', 'version'])
+timeline_encoder = RowEncoder([x.key for x in TIMELINE_COLUMNS])
+product_sales_encoder = RowEncoder(['product_id', 'name', 'quantity', 'orders', 'revenue'])
 
 
 @router.post('/new', status_code=status.HTTP_201_CREATED)
@@ -25,33 +46,130 @@ async def new_order(order: OrderReq,
     return {'order_id': order.id}
 
 
-@router.get('/my', response_model=list[UserOrderResponse])
-async def get_user_orders(user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
+@router.post('/batch', status_code=status.HTTP_201_CREATED, response_model=OrderBatchResponse)
+async def new_orders_batch(orders: list[OrderReq],
+                           user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
+                           order_command: OrderCommands = Depends()):
+    results = await order_command.create_batch(orders)
+    return {'results': results}
+
+
+@router.post('/transitions', response_model=OrderTransitionsResponse)
+async def transit_orders(transitions: list[OrderTransitionReq],
+                         user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
+                         order_command: OrderCommands = Depends()):
+    UserService.is_rw_access(user)
+    results = await order_command.transit_many(transitions)
+    return {'results': results}
+
+
+@router.get('/my', response_model=UserOrderPagesResponse)
+async def get_user_orders(cursor: str | None = None,
+                          page_size: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_MAX_PAGE_SIZE),
+                          order_status: list[Status] = Query([], alias='status'),
+                          active: bool = False,
+                          user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
                           order_query: OrderQueries = Depends()):
-    orders = await order_query.get_orders_by_username(user.username)
-    return orders
+    statuses = order_status
+    if active:
+        statuses = [x for x in statuses if x in ACTIVE_STATUSES] if statuses else list(ACTIVE_STATUSES)
+        if not statuses:
+            return json_response({'orders': [], 'has_more': False, 'next_cursor': None})
+
+    position = decode_cursor(cursor) if cursor else None
+    orders = await order_query.get_orders_by_username(user.username, position, statuses, page_size)
+
+    has_more = False
+    next_cursor = None
+    if len(orders) > page_size:
+        has_more = True
+        orders.pop(-1)
+        next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id)
+
+    return json_response({'orders': user_order_encoder.build_many(orders),
+                          'has_more': has_more,
+                          'next_cursor': next_cursor})
 
 
 @router.get('/all', response_model=OrderPagesResponse)
-async def get_all_orders(page: int = 1,
+async def get_all_orders(page: int | None = Query(None, ge=1),
+                         cursor: str | None = None,
+                         page_size: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_MAX_PAGE_SIZE),
                          user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
                          order_query: OrderQueries = Depends()):
     UserService.is_rw_access(user)
 
-    orders = await order_query.get_by_pages(page)
+    if page is not None:
+        orders = await order_query.get_by_pages(page, page_size)
+    else:
+        position = decode_cursor(cursor) if cursor else None
+        orders = await order_query.get_page_after(position, page_size)
+
+    has_more = False
+    next_cursor = None
+    if len(orders) > page_size:
+        has_more = True
+        orders.pop(-1)
+        if page is None:
+            next_cursor = encode_cursor(orders[-1].updated_at, orders[-1].id)
+
+    return json_response({'orders': order_encoder.build_many(orders),
+                          'has_more': has_more,
+                          'next_cursor': next_cursor})
+
+
+@router.get('/top-products', response_model=TopProductsResponse)
+async def get_top_products(since: datetime | None = None,
+                           until: datetime | None = None,
+                           limit: int = Query(10, ge=1, le=TOP_PRODUCTS_MAX_LIMIT),
+                           user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
+                           order_query: OrderQueries = Depends()):
+    UserService.is_rw_access(user)
+
+    since, until = stats_window(since, until)
+    products = await order_query.get_top_products(since, until, limit)
+
+    return json_response({'since': since,
+                          'until': until,
+                          'products': product_sales_encoder.build_many(products)})
+
+
+@router.get('/by-product/{product_id}', response_model=OrderPagesResponse)
+async def get_orders_with_product(product_id: UUID,
+                                  since: datetime | None = None,
+                                  until: datetime | None = None,
+                                  cursor: str | None = None,
+                                  page_size: int = Query(ORDERS_PAGE_SIZE, ge=1, le=ORDERS_MAX_PAGE_SIZE),
+                                  user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
+                                  order_query: OrderQueries = Depends()):
+    UserService.is_rw_access(user)
+
+    since, until = stats_window(since, until)
+    position = decode_cursor(cursor) if cursor else None
+    orders = await order_query.get_orders_with_product(product_id, since, until, position, page_size)
+
     has_more = False
-    if len(orders) > 10:
+    next_cursor = None
+    if len(orders) > page_size:
         has_more = True
         orders.pop(-1)
+        next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id)
 
-    return {'orders': orders, 'has_more': has_more}
+    return json_response({'orders': order_encoder.build_many(orders),
+                          'has_more': has_more,
+                          'next_cursor': next_cursor})
+
+
+def stats_window(since: datetime | None, until: datetime | None) -> tuple[datetime, datetime]:
+    until = until or datetime.now(timezone.utc)
+    return since or until - PRODUCT_STATS_WINDOW, until
 
 
 @router.get('/{order_id}', response_model=OrderResponse)
 async def get_order(order_id: UUID,
                     user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
                     order_repo: OrderRepository = Depends()):
-    order = await order_repo.get_by_id(order_id)
+    order = await order_repo.get_by_id(order_id, coalesce=True)
     if order is None:
         raise OrderNotFoundException
 
@@ -61,6 +179,20 @@ async def get_order(order_id: UUID,
         raise NoPermissionByRole
 
 
+@router.get('/{order_id}/timeline', response_model=OrderTimelineResponse)
+async def get_order_timeline(order_id: UUID,
+                             user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
+                             order_query: OrderQueries = Depends()):
+    timeline = await order_query.get_timeline(order_id)
+    if timeline is None:
+        raise OrderNotFoundException
+
+    if timeline.customer_name == user.username or UserService.is_rw_access(user):
+        return json_response(timeline_encoder.build(timeline))
+    else:
+        raise NoPermissionByRole
+
+
 @router.patch('/{order_id}', status_code=status.HTTP_202_ACCEPTED)
 async def update_order(order_id: UUID,
                        order: OrderUpdate,
@@ -73,74 +205,80 @@ async def update_order(order_id: UUID,
 
 
 @router.websocket("/{order_id}/ws")
-async def websocket_endpoint(order_id: UUID,
-                             websocket: WebSocket,
-                             order_query: OrderQueries = Depends()):
-    statuses = await order_query.get_statuses(order_id)
-
-    if len(statuses) == 0:
-        raise OrderNotFoundException()
-
+async def websocket_endpoint(order_id: UUID, websocket: WebSocket):
+    tracker = order_connections.connect(str(order_id), websocket)
     try:
-        await websocket.accept()
-        cache = None
-        while True:
-            await asyncio.wait_for(websocket.send_text('ping'), timeout=2.0)
-            msg = await asyncio.wait_for(websocket.receive_text(), timeout=2.0)
-            assert msg == 'pong'
+        await open_order_stream(order_id, websocket, tracker)
+        await order_connections.listen(tracker)
+    finally:
+        order_connections.disconnect(tracker)
 
-            statuses = await order_query.get_statuses(order_id)
-            new_statuses = check_new_events(statuses, cache)
 
-            if new_statuses:
-                await websocket.send_json(new_statuses)
-                cache = statuses
+async def open_order_stream(order_id: UUID, websocket: WebSocket, tracker: Tracker):
+    # the tracker buffers events from here on, a snapshot read that started earlier could miss some.
+    # Always the primary: events notified before connect reach the socket only through the snapshot,
+    # and a lagging replica could still lack them
+    connected_at = time.time()
+    async with SessionInst() as db:
+        statuses = await OrderQueries(db).get_statuses(order_id, coalesce=True, since=connected_at)
 
-            await asyncio.sleep(10)
-    finally:
-        await websocket.close()
+    if len(statuses) == 0:
+        raise OrderNotFoundException()
+
+    await websocket.accept()
+    await order_connections.activate(tracker, statuses)
 
 
 @router.post('/{order_id}/begin', status_code=status.HTTP_204_NO_CONTENT)
 async def begin_order(order_id: UUID,
+                      response: Response,
+                      version: int | None = None,
                       user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
                       order_command: OrderCommands = Depends()):
     UserService.is_rw_access(user)
-    async with order_command.wrapper(order_id) as order:
-        order.begin()
+    new_version = await order_command.transit(order_id, 'begin', version)
+    response.headers['X-Order-Version'] = str(new_version)
 
 
 @router.post('/{order_id}/ready', status_code=status.HTTP_204_NO_CONTENT)
 async def order_is_ready(order_id: UUID,
+                         response: Response,
+                         version: int | None = None,
                          user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
                          order_command: OrderCommands = Depends()):
     UserService.is_rw_access(user)
-    async with order_command.wrapper(order_id) as order:
-        order.ready()
+    new_version = await order_command.transit(order_id, 'ready', version)
+    response.headers['X-Order-Version'] = str(new_version)
 
 
 @router.post('/{order_id}/delivery', status_code=status.HTTP_204_NO_CONTENT)
 async def order_is_delivering(order_id: UUID,
+                              response: Response,
+                              version: int | None = None,
                               user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
                               order_command: OrderCommands = Depends()):
     UserService.is_rw_access(user)
-    async with order_command.wrapper(order_id) as order:
-        order.delivery()
+    new_version = await order_command.transit(order_id, 'delivery', version)
+    response.headers['X-Order-Version'] = str(new_version)
 
 
 @router.post('/{order_id}/complete', status_code=status.HTTP_204_NO_CONTENT)
 async def complete_order(order_id: UUID,
+                         response: Response,
+                         version: int | None = None,
                          user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
                          order_command: OrderCommands = Depends()):
     UserService.is_rw_access(user)
-    async with order_command.wrapper(order_id) as order:
-        order.complete()
+    new_version = await order_command.transit(order_id, 'complete', version)
+    response.headers['X-Order-Version'] = str(new_version)
 
 
 @router.post('/{order_id}/cancel', status_code=status.HTTP_204_NO_CONTENT)
 async def cancel_order(order_id: UUID,
+                       response: Response,
+                       version: int | None = None,
                        user: AuthorizedUserEntity = Depends(UserService.get_user_from_token),
                        order_command: OrderCommands = Depends()):
     UserService.is_rw_access(user)
-    async with order_command.wrapper(order_id) as order:
-        order.cancel()
+    new_version = await order_command.transit(order_id, 'cancel', version)
+    response.headers['X-Order-Version'] = str(new_version)
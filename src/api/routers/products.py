@@ -1,25 +1,99 @@
-from fastapi import APIRouter, Depends
+import os
+from typing import Any, Awaitable, Callable, Hashable
+from uuid import UUID
 
-from api.schemas import ProductResponse
+from fastapi import APIRouter, Depends, Request, Response, status
+
+from api.encoders import dump_json
+from api.routing import InstrumentedRoute
+from api.schemas import ProductResponse, ProductDetailsResponse
 from products.application.query import ProductQuery
+from products.infra.cache import catalog_cache
+from products.infra.notifier import catalog_version
 
 from exceptions import ProductNotFoundException
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', 60))
+CATALOG_CACHE_CONTROL = f'public, max-age={CATALOG_MAX_AGE}'
+
+
+def catalog_etag(version: int) -> str:
+    return f'"catalog-{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison, which is what If-None-Match uses. ``*`` is not a match here, see ``matches_any``."""
+    if not if_none_match:
+        return False
+    return any(x.strip().removeprefix('W/') == etag for x in if_none_match.split(','))
+
+
+def matches_any(if_none_match: str | None) -> bool:
+    """``If-None-Match: *``, which only matches once a current representation is known to exist."""
+    if not if_none_match:
+        return False
+    return any(x.strip() == '*' for x in if_none_match.split(','))
+
+
+def catalog_response(version: int | None, body: bytes | None = None) -> Response:
+    headers = {'Cache-Control': CATALOG_CACHE_CONTROL}
+    if version is not None:
+        headers['ETag'] = catalog_etag(version)
+    if body is None:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+async def conditional_catalog_response(request: Request,
+                                       key: Hashable,
+                                       load: Callable[[], Awaitable[tuple[int | None, Any]]]) -> Response:
+    """Answers from the known catalog version before any query runs.
+
+    A matching ``If-None-Match`` gets a 304, otherwise the body serialized at
+    the current version is reused. Only a miss reads the database, and the
+    body is cached under the version read together with the data.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    version = catalog_version.current
+    if version is not None:
+        if etag_matches(if_none_match, catalog_etag(version)):
+            return catalog_response(version)
+
+        cached = catalog_cache.get_body(key)
+        if cached is not None and cached[0] >= version:
+            # only existing representations are cached
+            return catalog_response(cached[0], None if matches_any(if_none_match) else cached[1])
+
+    # raises for a resource that does not exist, before ``*`` is considered
+    version, content = await load()
+    body = dump_json(content)
+    if version is not None:
+        catalog_cache.put_body(key, version, body)
+    return catalog_response(version, None if matches_any(if_none_match) else body)
 
 
 @router.get('/category/{category_name}', response_model=list[ProductResponse])
 async def products_by_category(category_name: str,
+                               request: Request,
                                product_query: ProductQuery = Depends(ProductQuery)):
-    products = await product_query.get_category_products(category_name)
-    return products
+    async def load():
+        version, products = await product_query.get_versioned_category_products(category_name)
+        return version, [{'id': x.id, 'product_name': x.product_name, 'price': x.price} for x in products]
+
+    return await conditional_catalog_response(request, ('category', category_name), load)
 
 
-@router.get('/product/{product_id}')
-async def get_product(product_id: int,
+@router.get('/product/{product_id}', response_model=ProductDetailsResponse)
+async def get_product(product_id: UUID,
+                      request: Request,
                       product_query: ProductQuery = Depends(ProductQuery)):
-    product = await product_query.get_product(product_id)
-    if not product:
-        raise ProductNotFoundException()
+    async def load():
+        version, product = await product_query.get_versioned_product(product_id)
+        if not product:
+            raise ProductNotFoundException()
+        return version, {'id': product.id, 'product_name': product.product_name,
+                         'price': product.price, 'category_name': product.category_name}
 
-    return product
+    return await conditional_catalog_response(request, ('product', product_id), load)
@@ -0,0 +1,34 @@
+import time
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException
+
+from shared.infra.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+
+
+class InstrumentedRoute(APIRoute):
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def instrumented_handler(request: Request) -> Response:
+            method = request.method
+            status_code = 500
+            in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method, path)
+            in_flight.inc()
+            started_at = time.perf_counter()
+            try:
+                response = await handler(request)
+                status_code = response.status_code
+                return response
+            except HTTPException as e:
+                status_code = e.status_code
+                raise
+            finally:
+                in_flight.dec()
+                HTTP_REQUEST_DURATION.labels(method, path, str(status_code)).observe(time.perf_counter() - started_at)
+
+        return instrumented_handler
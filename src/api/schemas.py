@@ -10,6 +10,10 @@ class ProductResponse(BaseModel):
     price: float
 
 
+class ProductDetailsResponse(ProductResponse):
+    category_name: str
+
+
 class DeliveryAddressResponse(BaseModel):
     address: str
 
@@ -37,8 +41,83 @@ class DeliveryInfoResponse(DeliveryAddressResponse):
 class OrderResponse(UserOrderResponse):
     customer_name: str
     delivery_info: DeliveryInfoResponse
+    version: int = 0
+
+
+class UserOrderPagesResponse(BaseModel):
+    orders: list[UserOrderResponse]
+    has_more: bool
+    next_cursor: str | None = None
 
 
 class OrderPagesResponse(BaseModel):
     orders: list[OrderResponse]
     has_more: bool
+    next_cursor: str | None = None
+
+
+class OrderBatchResult(BaseModel):
+    index: int
+    order_id: UUID | None = None
+    errors: list[str] = []
+
+
+class OrderBatchResponse(BaseModel):
+    results: list[OrderBatchResult]
+
+
+class ProductSalesResponse(BaseModel):
+    product_id: UUID
+    name: str
+    quantity: int
+    orders: int
+    revenue: float
+
+
+class TopProductsResponse(BaseModel):
+    since: datetime
+    until: datetime
+    products: list[ProductSalesResponse]
+
+
+class OrderTimelineResponse(BaseModel):
+    order_id: UUID
+    order_status: str
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    ready_to_delivery_at: datetime | None = None
+    delivering_at: datetime | None = None
+    completed_at: datetime | None = None
+    canceled_at: datetime | None = None
+    last_event_id: UUID
+    last_event_at: datetime
+
+
+class OrderTransitionResult(BaseModel):
+    index: int
+    order_id: UUID
+    action: str
+    order_status: str | None = None
+    version: int | None = None
+    errors: list[str] = []
+
+
+class OrderTransitionsResponse(BaseModel):
+    results: list[OrderTransitionResult]
+
+
+class NearestCourierResponse(BaseModel):
+    courier_id: UUID
+    latitude: float
+    longitude: float
+    distance_km: float
+
+
+class CourierAssignmentResult(BaseModel):
+    order_id: UUID
+    courier_id: UUID
+    distance_km: float
+
+
+class CourierAssignmentsResponse(BaseModel):
+    assignments: list[CourierAssignmentResult]
@@ -1,29 +1,217 @@
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import os
 
+from shared.infra.metrics import DB_READ_ROUTING
+from shared.infra.replica import ReplicaMonitor
+
 db_name = os.getenv('POSTGRES_DB')
 user = os.getenv('POSTGRES_USER')
 password = os.getenv('POSTGRES_PASSWORD')
 domain = os.getenv('DB_DOMAIN')
+replica_domain = os.getenv('DB_REPLICA_DOMAIN')
+
+DB_ECHO = os.getenv('DB_ECHO', 'false').lower() in ('1', 'true', 'yes')
+# migrate: apply pending migrations on start, verify: only check the schema version, see migrations.verify
+DB_STARTUP_MODE = os.getenv('DB_STARTUP_MODE', 'migrate')
+DB_POOL_WARM = int(os.getenv('DB_POOL_WARM', 0))
+
+# worker processes sharing the database, gunicorn.conf.py sets it for its workers
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+# connections all workers together may open to one server, 0 leaves the pools unbounded by it
+DB_CONNECTION_BUDGET = int(os.getenv('DB_CONNECTION_BUDGET', 0))
+DB_POOL_SIZE = os.getenv('DB_POOL_SIZE')
+DB_MAX_OVERFLOW = os.getenv('DB_MAX_OVERFLOW')
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+# dedicated LISTEN connections of every worker: order events, catalog changes, courier positions
+DB_LISTEN_CONNECTIONS = 3
+
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+READ_YOUR_WRITES_WINDOW = float(os.getenv('DB_READ_YOUR_WRITES_WINDOW', 15))
+# the commit time travels with the client, so whichever worker or instance serves its next read sees it
+READ_YOUR_WRITES_COOKIE = 'last_write'
+# how far ahead of this clock a commit time recorded by another host may be
+CLOCK_SKEW = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def pool_limits(budget: int,
+                workers: int,
+                pool_size: int | None = None,
+                max_overflow: int | None = None) -> tuple[int, int]:
+    """Pool size and overflow of one worker.
+
+    Without a budget the explicit settings or SQLAlchemy's defaults apply.
+    With one, every worker gets an equal share minus its LISTEN connections;
+    overflow defaults to 0 there, since an overflow connection counts against
+    the budget all the same.
+    """
+    if not budget:
+        return 5 if pool_size is None else pool_size, 10 if max_overflow is None else max_overflow
+
+    share = budget // workers - DB_LISTEN_CONNECTIONS
+    max_overflow = 0 if max_overflow is None else max_overflow
+    pool_size = share - max_overflow if pool_size is None else pool_size
+    if pool_size < 1 or pool_size + max_overflow > share:
+        raise RuntimeError(f'DB_CONNECTION_BUDGET={budget} leaves {share} connections to each of {workers} workers '
+                           f'after {DB_LISTEN_CONNECTIONS} LISTEN connections, which does not fit '
+                           f'pool_size={pool_size} and max_overflow={max_overflow}')
+    return pool_size, max_overflow
+
 
-DATABASE_URL = f'postgresql+asyncpg://{user}:{password}@{domain}:5432/{db_name}'
-engine = create_async_engine(DATABASE_URL, echo=True)
+POOL_SIZE, MAX_OVERFLOW = pool_limits(DB_CONNECTION_BUDGET,
+                                      WEB_CONCURRENCY,
+                                      None if DB_POOL_SIZE is None else int(DB_POOL_SIZE),
+                                      None if DB_MAX_OVERFLOW is None else int(DB_MAX_OVERFLOW))
+POOL_OPTIONS = {'pool_size': POOL_SIZE, 'max_overflow': MAX_OVERFLOW, 'pool_timeout': DB_POOL_TIMEOUT}
+
+PG_DSN = f'postgresql://{user}:{password}@{domain}:5432/{db_name}'
+DATABASE_URL = PG_DSN.replace('postgresql://', 'postgresql+asyncpg://', 1)
+engine = create_async_engine(DATABASE_URL, echo=DB_ECHO, **POOL_OPTIONS)
 SessionInst = async_sessionmaker(bind=engine)
 
+read_engine = None
+replica_monitor = None
+ReadSessionInst = SessionInst
+if replica_domain:
+    REPLICA_DATABASE_URL = f'postgresql+asyncpg://{user}:{password}@{replica_domain}:5432/{db_name}'
+    read_engine = create_async_engine(REPLICA_DATABASE_URL, echo=DB_ECHO, **POOL_OPTIONS)
+    replica_monitor = ReplicaMonitor(read_engine, REPLICA_MAX_LAG)
+    ReadSessionInst = async_sessionmaker(bind=read_engine)
+
 Base = declarative_base()
 
 
+@event.listens_for(Session, 'after_commit')
+def mark_recent_writer(session: Session):
+    connection = session.info.get('connection')
+    if connection is not None:
+        connection.state.last_write_at = time.time()
+
+
+def client_last_write(connection: HTTPConnection) -> float | None:
+    """``time.time()`` of the client's last commit, None outside the read-your-writes window.
+
+    A commit in the current request wins over the cookie the client sent.
+    The cookie is client input: values that do not parse or lie in the
+    future are ignored rather than allowed to pin the client to the primary.
+    """
+    written_at = getattr(connection.state, 'last_write_at', None)
+    if written_at is None:
+        try:
+            written_at = float(connection.cookies.get(READ_YOUR_WRITES_COOKIE, ''))
+        except ValueError:
+            return None
+
+    now = time.time()
+    if not now - READ_YOUR_WRITES_WINDOW < written_at <= now + CLOCK_SKEW:
+        return None
+    return written_at
+
+
+def last_write_at(session: AsyncSession) -> float | None:
+    """``time.time()`` of the last commit by the client of this session, within the read-your-writes window."""
+    connection = session.info.get('connection')
+    if connection is None:
+        return None
+    return client_last_write(connection)
+
+
+class ReadYourWritesMiddleware:
+    """Hands the time of a commit made by the request back to the client in a cookie.
+
+    The cookie expires with the read-your-writes window, after which the
+    replica is expected to have caught up and reads may go there again.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_marker(message: Message):
+            if message['type'] == 'http.response.start':
+                written_at = scope.get('state', {}).get('last_write_at')
+                if written_at is not None:
+                    MutableHeaders(scope=message).append(
+                        'set-cookie',
+                        f'{READ_YOUR_WRITES_COOKIE}={written_at:.6f}; Max-Age={math.ceil(READ_YOUR_WRITES_WINDOW)}; '
+                        f'Path=/; HttpOnly; SameSite=Lax')
+            await send(message)
+
+        await self.app(scope, receive, send_with_marker)
+
+
 async def init():
-    async with engine.begin() as conn:
-        # await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
+    if DB_STARTUP_MODE == 'verify':
+        from migrations import verify
+        await verify(engine)
+    elif DB_STARTUP_MODE == 'migrate':
+        from migrations import upgrade
+        await upgrade(engine)
+    else:
+        raise RuntimeError(f'Unknown DB_STARTUP_MODE {DB_STARTUP_MODE!r}, expected migrate or verify')
+
+    if DB_CONNECTION_BUDGET:
+        await check_connection_budget()
+
+
+async def check_connection_budget():
+    async with engine.connect() as conn:
+        res = await conn.execute(text("SELECT current_setting('max_connections')::int "
+                                      "- current_setting('superuser_reserved_connections')::int"))
+        available = res.scalar()
+
+    if DB_CONNECTION_BUDGET > available:
+        logger.warning('DB_CONNECTION_BUDGET=%d is above the %d connections the server accepts',
+                       DB_CONNECTION_BUDGET, available)
+    logger.info('Worker pool: %d + %d overflow connections, %d workers, budget %d of %d',
+                POOL_SIZE, MAX_OVERFLOW, WEB_CONCURRENCY, DB_CONNECTION_BUDGET, available)
 
 
-async def get_session() -> AsyncSession:
+async def get_session(connection: HTTPConnection) -> AsyncSession:
     async with SessionInst() as session:
+        session.info['connection'] = connection
         try:
             yield session
         except:
             await session.rollback()
             raise
+
+
+@asynccontextmanager
+async def read_session(connection: HTTPConnection):
+    target = 'replica'
+    if read_engine is None or not replica_monitor.healthy:
+        target = 'primary'
+    elif client_last_write(connection) is not None:
+        target = 'primary'
+
+    DB_READ_ROUTING.labels(target).inc()
+    session_factory = ReadSessionInst if target == 'replica' else SessionInst
+    async with session_factory() as session:
+        session.info['connection'] = connection
+        try:
+            yield session
+        except:
+            await session.rollback()
+            raise
+
+
+async def get_read_session(connection: HTTPConnection) -> AsyncSession:
+    async with read_session(connection) as session:
+        yield session
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from db_config import SessionInst
+from delivery.infra.positions import COURIER_POSITION_TTL, courier_positions
+from delivery.infra.repository import DispatchRepository
+from orders.infra.event_store import OrderEventStore
+from orders.infra.outbox import order_outbox
+from orders.infra.repository import OrderRepository
+
+from .service import COURIER_ASSIGNMENT_BATCH, CourierAssignmentService
+
+logger = logging.getLogger(__name__)
+
+COURIER_ASSIGNMENT_INTERVAL = float(os.getenv('COURIER_ASSIGNMENT_INTERVAL', 5))
+
+
+class CourierAssignmentLoop:
+    """Assigns couriers every ``interval`` seconds, or right away when woken up."""
+
+    def __init__(self, session_factory: async_sessionmaker, interval: float, batch_size: int):
+        self._session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.runs = 0
+        self.assigned = 0
+        self.expired = 0
+        self.last_run_seconds = 0.0
+
+    @property
+    def stats(self) -> dict:
+        return {'runs': self.runs,
+                'assigned': self.assigned,
+                'expired': self.expired,
+                'couriers': len(courier_positions),
+                'last_run_seconds': self.last_run_seconds}
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> list[dict]:
+        self.expired += courier_positions.expire(COURIER_POSITION_TTL)
+        if not len(courier_positions):
+            return []
+
+        started_at = time.perf_counter()
+        async with self._session_factory() as session:
+            service = CourierAssignmentService(DispatchRepository(session),
+                                               OrderRepository(OrderEventStore(session), session),
+                                               session)
+            assigned = await service.assign_ready_orders(self.batch_size)
+
+        self.runs += 1
+        self.assigned += len(assigned)
+        self.last_run_seconds = time.perf_counter() - started_at
+        return assigned
+
+    async def _run(self):
+        while True:
+            try:
+                assigned = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Courier assignment failed')
+                assigned = []
+
+            if len(assigned) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+
+courier_assignment = CourierAssignmentLoop(SessionInst, COURIER_ASSIGNMENT_INTERVAL, COURIER_ASSIGNMENT_BATCH)
+
+
+async def on_order_ready(message: dict):
+    courier_assignment.wake()
+
+
+order_outbox.register(on_order_ready, 'ReadyToDelivery')
@@ -0,0 +1,124 @@
+from math import inf
+from typing import Hashable, Sequence
+
+from delivery.domain.geo import Point
+from delivery.infra.spatial import GridIndex
+
+Assignment = dict[Hashable, tuple[Hashable, float]]
+
+
+def match_greedy(orders: Sequence[tuple[Hashable, Point]],
+                 index: GridIndex,
+                 busy: set = frozenset(),
+                 candidates: int = 5,
+                 max_km: float = inf) -> Assignment:
+    """Hands out the globally shortest order-courier pairs first.
+
+    Each order proposes its ``candidates`` nearest free couriers. Orders whose
+    proposals were all taken by closer orders look up the nearest courier left.
+    """
+    pairs = []
+    for order_id, point in orders:
+        for courier_id, km in index.nearest(point.latitude, point.longitude, candidates, max_km, busy):
+            pairs.append((km, order_id, courier_id))
+    pairs.sort(key=lambda x: x[0])
+
+    assigned: Assignment = {}
+    taken = set(busy)
+    for km, order_id, courier_id in pairs:
+        if order_id in assigned or courier_id in taken:
+            continue
+        assigned[order_id] = (courier_id, km)
+        taken.add(courier_id)
+
+    for order_id, point in orders:
+        if order_id in assigned:
+            continue
+        found = index.nearest(point.latitude, point.longitude, 1, max_km, taken)
+        if found:
+            courier_id, km = found[0]
+            assigned[order_id] = (courier_id, km)
+            taken.add(courier_id)
+
+    return assigned
+
+
+def match_optimal(orders: Sequence[tuple[Hashable, Point]],
+                  index: GridIndex,
+                  busy: set = frozenset(),
+                  candidates: int = 5,
+                  max_km: float = inf) -> Assignment:
+    """Minimises the total distance over the orders' nearest couriers, O(n^3), for small batches."""
+    proposals = [dict(index.nearest(point.latitude, point.longitude, candidates, max_km, busy))
+                 for _, point in orders]
+    couriers = list({courier_id: None for x in proposals for courier_id in x})
+    if not couriers:
+        return {}
+
+    # pairs outside the proposals cost more than any real pair, so they are only used when nothing else fits
+    unreachable = 1 + 2 * max((km for x in proposals for km in x.values()), default=0) * len(orders)
+    cost = [[x.get(courier_id, unreachable) for courier_id in couriers] for x in proposals]
+    transposed = len(orders) > len(couriers)
+    if transposed:
+        cost = [list(x) for x in zip(*cost)]
+
+    assigned: Assignment = {}
+    for row, column in enumerate(hungarian(cost)):
+        order, courier = (column, row) if transposed else (row, column)
+        km = proposals[order].get(couriers[courier])
+        if km is not None:
+            assigned[orders[order][0]] = (couriers[courier], km)
+
+    return assigned
+
+
+def hungarian(cost: Sequence[Sequence[float]]) -> list[int]:
+    """Assigns every row to a distinct column with the minimum total cost, needs rows <= columns."""
+    n, m = len(cost), len(cost[0])
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    owner, way = [0] * (m + 1), [0] * (m + 1)
+    for row in range(1, n + 1):
+        owner[0] = row
+        column = 0
+        slack = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[column] = True
+            current, delta, next_column = owner[column], inf, 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                reduced = cost[current - 1][j - 1] - u[current] - v[j]
+                if reduced < slack[j]:
+                    slack[j], way[j] = reduced, column
+                if slack[j] < delta:
+                    delta, next_column = slack[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    slack[j] -= delta
+            column = next_column
+            if owner[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+
+    result = [0] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            result[owner[j] - 1] = j - 1
+    return result
+
+
+def match(orders: Sequence[tuple[Hashable, Point]],
+          index: GridIndex,
+          busy: set = frozenset(),
+          candidates: int = 5,
+          max_km: float = inf,
+          optimal_up_to: int = 30) -> Assignment:
+    strategy = match_optimal if len(orders) <= optimal_up_to else match_greedy
+    return strategy(orders, index, busy, candidates, max_km)
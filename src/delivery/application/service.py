@@ -0,0 +1,93 @@
+import json
+import os
+from uuid import UUID
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db_config import get_session
+from delivery.domain.geo import Point
+from delivery.infra.positions import COURIER_POSITIONS_CHANNEL, courier_positions, publish_position_stmt
+from delivery.infra.repository import DispatchRepository
+from orders.domain.entity import DeliveryInfoEntity
+from orders.infra.repository import OrderRepository
+
+from .matching import match
+
+COURIER_MAX_DISTANCE_KM = float(os.getenv('COURIER_MAX_DISTANCE_KM', 10))
+COURIER_CANDIDATES = int(os.getenv('COURIER_CANDIDATES', 5))
+COURIER_ASSIGNMENT_BATCH = int(os.getenv('COURIER_ASSIGNMENT_BATCH', 200))
+COURIER_OPTIMAL_BATCH = int(os.getenv('COURIER_OPTIMAL_BATCH', 30))
+DELIVERY_ORIGIN = os.getenv('DELIVERY_ORIGIN')  # "lat,lon" used for orders placed without coordinates
+
+
+def _origin() -> Point | None:
+    if not DELIVERY_ORIGIN:
+        return None
+    latitude, longitude = (float(x) for x in DELIVERY_ORIGIN.split(','))
+    return Point(latitude, longitude)
+
+
+class CourierAssignmentService:
+
+    def __init__(self,
+                 dispatch_repo: DispatchRepository = Depends(),
+                 order_repo: OrderRepository = Depends(),
+                 db: AsyncSession = Depends(get_session)):
+        self._dispatch_repo = dispatch_repo
+        self._order_repo = order_repo
+        self._db = db
+
+    async def report_position(self, courier_id: UUID, latitude: float, longitude: float, available: bool):
+        payload = json.dumps({'courier_id': str(courier_id),
+                              'latitude': latitude,
+                              'longitude': longitude,
+                              'available': available})
+        await self._db.execute(publish_position_stmt, {'channel': COURIER_POSITIONS_CHANNEL, 'payload': payload})
+        await self._db.commit()
+
+    @staticmethod
+    def nearest(latitude: float, longitude: float, limit: int, max_km: float = COURIER_MAX_DISTANCE_KM) -> list[dict]:
+        results = []
+        for courier_id, km in courier_positions.nearest(latitude, longitude, limit, max_km):
+            position = courier_positions.position(courier_id)
+            results.append({'courier_id': courier_id,
+                            'latitude': position.latitude,
+                            'longitude': position.longitude,
+                            'distance_km': km})
+        return results
+
+    async def assign_ready_orders(self, limit: int = COURIER_ASSIGNMENT_BATCH) -> list[dict]:
+        """Matches ready orders without a courier to the nearest free couriers and stores the result.
+
+        One dispatcher runs at a time across app instances, others return at once.
+        """
+        if not len(courier_positions) or not await self._dispatch_repo.try_lock():
+            return []
+
+        rows = await self._dispatch_repo.lock_unassigned(limit)
+        origin = _origin()
+        orders, infos = [], {}
+        for row in rows:
+            point = Point(row.latitude, row.longitude) if row.latitude is not None else origin
+            if point is None:
+                continue
+            orders.append((row.order_id, point))
+            infos[row.order_id] = row
+        if not orders:
+            return []
+
+        busy = await self._dispatch_repo.busy_couriers()
+        assigned = match(orders, courier_positions, busy, COURIER_CANDIDATES, COURIER_MAX_DISTANCE_KM,
+                         COURIER_OPTIMAL_BATCH)
+
+        assignments = []
+        for order_id, (courier_id, km) in assigned.items():
+            row = infos[order_id]
+            assignments.append((order_id, DeliveryInfoEntity(id=row.id, address=row.address, courier_id=courier_id,
+                                                             latitude=row.latitude, longitude=row.longitude)))
+        stored = await self._order_repo.assign_couriers(assignments)
+        await self._order_repo.commit()
+
+        return [{'order_id': order_id, 'courier_id': courier_id, 'distance_km': km}
+                for order_id, (courier_id, km) in assigned.items() if order_id in stored]
@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+
+
+class CourierPositionReq(BaseModel):
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    available: bool = True
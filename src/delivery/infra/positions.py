@@ -0,0 +1,31 @@
+import json
+import os
+from uuid import UUID
+
+from sqlalchemy import text
+
+from db_config import PG_DSN
+from shared.infra.pubsub import PgNotifyListener
+
+from .spatial import GridIndex
+
+COURIER_POSITIONS_CHANNEL = 'courier_positions'
+COURIER_GRID_DEGREES = float(os.getenv('COURIER_GRID_DEGREES', 0.01))
+COURIER_POSITION_TTL = float(os.getenv('COURIER_POSITION_TTL', 120))
+
+# positions travel through NOTIFY, so every worker process keeps the same index without table writes
+publish_position_stmt = text('SELECT pg_notify(:channel, :payload)')
+
+courier_positions = GridIndex(COURIER_GRID_DEGREES)
+
+
+def apply_position(payload: str):
+    message = json.loads(payload)
+    courier_id = UUID(message['courier_id'])
+    if message['available']:
+        courier_positions.update(courier_id, message['latitude'], message['longitude'])
+    else:
+        courier_positions.remove(courier_id)
+
+
+courier_position_listener = PgNotifyListener(PG_DSN, COURIER_POSITIONS_CHANNEL, apply_position)
@@ -0,0 +1,42 @@
+from fastapi import Depends
+from sqlalchemy import Row, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db_config import get_session
+from models import DeliveryInfo, Order
+from orders.domain.value_obj import COURIER_STATUSES, Status
+
+DISPATCH_LOCK_KEY = 0x636F7572  # any constant shared by all app instances
+
+
+class DispatchRepository:
+
+    def __init__(self, db: AsyncSession = Depends(get_session)):
+        self._db = db
+
+    async def try_lock(self) -> bool:
+        """Makes the current transaction the only dispatcher until it ends."""
+        res = await self._db.execute(select(func.pg_try_advisory_xact_lock(DISPATCH_LOCK_KEY)))
+        return res.scalar()
+
+    async def busy_couriers(self) -> set:
+        stmt = select(DeliveryInfo.courier_id).distinct() \
+            .join(Order.delivery_info) \
+            .where(DeliveryInfo.courier_id.is_not(None),
+                   Order.order_status.in_([x.value for x in COURIER_STATUSES]))
+        res = await self._db.execute(stmt)
+
+        return set(res.scalars())
+
+    async def lock_unassigned(self, limit: int) -> list[Row]:
+        """Ready orders without a courier, oldest first, skipping the ones another transaction holds."""
+        stmt = select(Order.id.label('order_id'), DeliveryInfo.id, DeliveryInfo.address,
+                      DeliveryInfo.latitude, DeliveryInfo.longitude) \
+            .join(Order.delivery_info) \
+            .where(Order.order_status == Status.READY_TO_DELIVERY.value, DeliveryInfo.courier_id.is_(None)) \
+            .order_by(Order.updated_at) \
+            .limit(limit) \
+            .with_for_update(of=DeliveryInfo, skip_locked=True)
+        res = await self._db.execute(stmt)
+
+        return list(res.all())
@@ -0,0 +1,130 @@
+import time
+from heapq import heappush, heapreplace
+from math import cos, floor, inf, radians
+from typing import Container, Hashable, Iterator
+
+from delivery.domain.geo import KM_PER_DEGREE_LATITUDE, Point, haversine_km
+
+Cell = tuple[int, int]
+
+
+class GridIndex:
+    """Moving points bucketed into a uniform latitude/longitude grid.
+
+    A lookup walks square rings of cells outwards from the query cell and stops
+    as soon as the next ring cannot hold anything closer than the k-th best
+    match, so it visits a handful of cells however many points are indexed.
+    Once a ring would be larger than the number of occupied cells, the
+    remaining occupied cells are scanned directly instead. Updates are O(1).
+
+    ``cell_degrees`` of 0.01 is about 1.1 km north-south, pick it close to the
+    usual distance between neighbours.
+    """
+
+    def __init__(self, cell_degrees: float = 0.01):
+        self.cell_degrees = cell_degrees
+        self._cells: dict[Cell, dict[Hashable, tuple[float, float]]] = {}
+        self._points: dict[Hashable, tuple[Cell, float]] = {}
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key: Hashable):
+        return key in self._points
+
+    def update(self, key: Hashable, latitude: float, longitude: float):
+        cell = self._cell(latitude, longitude)
+        current = self._points.get(key)
+        if current is not None and current[0] != cell:
+            self._discard(key, current[0])
+        self._cells.setdefault(cell, {})[key] = (latitude, longitude)
+        self._points[key] = (cell, time.monotonic())
+
+    def remove(self, key: Hashable):
+        current = self._points.pop(key, None)
+        if current is not None:
+            self._discard(key, current[0])
+
+    def position(self, key: Hashable) -> Point | None:
+        current = self._points.get(key)
+        if current is None:
+            return None
+        return Point(*self._cells[current[0]][key])
+
+    def expire(self, max_age: float) -> int:
+        """Drops points not updated within ``max_age`` seconds."""
+        deadline = time.monotonic() - max_age
+        stale = [key for key, (_, updated_at) in self._points.items() if updated_at < deadline]
+        for key in stale:
+            self.remove(key)
+        return len(stale)
+
+    def nearest(self,
+                latitude: float,
+                longitude: float,
+                k: int = 1,
+                max_km: float = inf,
+                exclude: Container[Hashable] = ()) -> list[tuple[Hashable, float]]:
+        """Up to ``k`` closest points within ``max_km`` as ``(key, km)``, closest first."""
+        best: list[tuple[float, Hashable]] = []
+
+        def visit(points: dict[Hashable, tuple[float, float]]):
+            for key, (lat, lon) in points.items():
+                if key in exclude:
+                    continue
+                km = haversine_km(latitude, longitude, lat, lon)
+                if km > max_km:
+                    continue
+                if len(best) < k:
+                    heappush(best, (-km, key))
+                elif km < -best[0][0]:
+                    heapreplace(best, (-km, key))
+
+        cx, cy = self._cell(latitude, longitude)
+        ring = 0
+        while self._cells:
+            if ring:
+                reach = (ring - 1) * self._ring_km(latitude, ring)
+                if reach > max_km or (len(best) == k and reach >= -best[0][0]):
+                    break
+            if 8 * ring > len(self._cells):
+                for (x, y), points in self._cells.items():
+                    if max(abs(x - cx), abs(y - cy)) >= ring:
+                        visit(points)
+                break
+
+            for cell in self._ring(cx, cy, ring):
+                points = self._cells.get(cell)
+                if points:
+                    visit(points)
+            ring += 1
+
+        return sorted(((key, -km) for km, key in best), key=lambda x: x[1])
+
+    def _cell(self, latitude: float, longitude: float) -> Cell:
+        return floor(longitude / self.cell_degrees), floor(latitude / self.cell_degrees)
+
+    def _ring_km(self, latitude: float, ring: int) -> float:
+        # a cell is narrowest east-west at the latitude farthest from the equator
+        # the ring reaches, the small margin covers great circle vs parallel arcs
+        widest_latitude = min(abs(latitude) + ring * self.cell_degrees, 89.9)
+        return self.cell_degrees * KM_PER_DEGREE_LATITUDE * cos(radians(widest_latitude)) * 0.99
+
+    @staticmethod
+    def _ring(cx: int, cy: int, ring: int) -> Iterator[Cell]:
+        if ring == 0:
+            yield cx, cy
+            return
+
+        for x in range(cx - ring, cx + ring + 1):
+            yield x, cy - ring
+            yield x, cy + ring
+        for y in range(cy - ring + 1, cy + ring):
+            yield cx - ring, y
+            yield cx + ring, y
+
+    def _discard(self, key: Hashable, cell: Cell):
+        points = self._cells[cell]
+        del points[key]
+        if not points:
+            del self._cells[cell]
@@ -44,3 +44,22 @@ class NoPermissionByRole(HTTPException):
     def __init__(self):
         super().__init__(status_code=status.HTTP_403_FORBIDDEN,
                          detail='No permission to do it')
+
+
+class InvalidCursorError(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST,
+                         detail='Invalid pagination cursor')
+
+
+class ServiceOverloadedError(HTTPException):
+    def __init__(self, retry_after: int = 1):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         detail='Service is overloaded, try again later',
+                         headers={'Retry-After': str(retry_after)})
+
+
+class BatchTooLargeError(HTTPException):
+    def __init__(self, limit: int):
+        super().__init__(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                         detail=f'Batch must contain at most {limit} items')
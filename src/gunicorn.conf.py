@@ -0,0 +1,41 @@
+"""Multi-process serving: ``gunicorn main:app`` from this directory.
+
+WEB_CONCURRENCY       worker processes, one per core by default
+DB_CONNECTION_BUDGET  connections all workers may open to Postgres together,
+                      db_config splits it into per-worker pools
+GRACEFUL_TIMEOUT      seconds a worker gets to finish requests on reload/stop
+MAX_REQUESTS          recycle a worker after that many requests, 0 disables
+
+``kill -HUP <master pid>`` reloads gracefully: new workers start with the
+current code and settings while the old ones drain.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'uvicorn_worker.UvicornWorker'
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.getenv('WORKER_TIMEOUT', 60))
+keepalive = 5
+max_requests = int(os.getenv('MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# workers inherit the environment of the master: db_config sizes each pool from the worker count,
+# prometheus_client switches to multiprocess files when the directory is set
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'prometheus_multiproc'))
+
+
+def on_starting(server):
+    # files of a previous run would be summed into the new one
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
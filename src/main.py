@@ -1,4 +1,7 @@
+import asyncio
+import time
 from contextlib import asynccontextmanager
+from uuid import UUID
 
 from fastapi import FastAPI
 from fastapi.responses import HTMLResponse
@@ -6,20 +9,127 @@ from fastapi.responses import HTMLResponse
 from api.routers.orders import router as order_router
 from api.routers.products import router as product_router
 from api.routers.auth import router as auth_router
+from api.routers.metrics import router as metrics_router
+from api.routers.couriers import router as courier_router
 
-from db_config import init, engine
+from db_config import init, engine, read_engine, replica_monitor, DB_POOL_WARM, ReadYourWritesMiddleware
+from orders.infra.notifier import order_event_listener, order_connections
+from orders.infra.outbox import order_outbox
+from delivery.application.dispatch import courier_assignment
+from delivery.infra.positions import courier_position_listener
+from user.application.hashing import password_hasher
+from products.infra.cache import catalog_cache
+from products.infra.notifier import catalog_listener, catalog_version
+from products.infra.snapshot import catalog_snapshot
+from user.application.service import token_cache
+from user.infra.repository import UserRepository
+from orders.application.query import OrderQueries, status_reads
+from orders.infra.event_store import OrderEventStore
+from orders.infra.repository import OrderRepository, order_reads
+from products.infra.repository import ProductRepository
+from shared.infra.metrics import instrument_engine, multiprocess_publisher, register_collector, register_stats, \
+    PoolCollector
+from shared.infra.startup import StartupTimer, warm_pool
+
+startup = StartupTimer()
+# CPU time of the interpreter start and the imports above, most of the time before the lifespan runs
+startup.record('imports', time.process_time())
+
+WARMUP_ID = UUID(int=0)
+# read-only shapes of the hottest requests, prepared on every warmed connection
+WARMUP_QUERIES = (
+    lambda db: UserRepository(db).get_by_name(''),
+    lambda db: ProductRepository(db).get_catalog_version(),
+    lambda db: ProductRepository(db).get_by_id(WARMUP_ID, cached=False),
+    lambda db: ProductRepository(db).get_products_by_category_name('', cached=False),
+    lambda db: OrderRepository(OrderEventStore(db), db).get_by_id(WARMUP_ID),
+    lambda db: OrderQueries(db).get_statuses(WARMUP_ID),
+    lambda db: OrderQueries(db).get_timeline(WARMUP_ID),
+    lambda db: OrderQueries(db).get_orders_by_username(''),
+    lambda db: OrderQueries(db).get_page_after(None),
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init()
+    with startup.phase('schema'):
+        await init()
+    with startup.phase('pool'):
+        for db_engine in engines.values():
+            await warm_pool(db_engine, DB_POOL_WARM, WARMUP_QUERIES)
+    with startup.phase('listeners'):
+        await asyncio.gather(order_event_listener.start(),
+                             catalog_listener.start(),
+                             courier_position_listener.start())
+    with startup.phase('background'):
+        if catalog_snapshot is not None:
+            catalog_snapshot.start()
+        order_connections.start()
+        order_outbox.start()
+        courier_assignment.start()
+        if replica_monitor is not None:
+            await replica_monitor.start()
+        if multiprocess_publisher is not None:
+            multiprocess_publisher.start()
+    startup.report()
     yield
+    if multiprocess_publisher is not None:
+        await multiprocess_publisher.stop()
+    if replica_monitor is not None:
+        await replica_monitor.stop()
+    await courier_assignment.stop()
+    await courier_position_listener.stop()
+    await order_outbox.stop()
+    await order_connections.stop()
+    if catalog_snapshot is not None:
+        await catalog_snapshot.stop()
+    await catalog_listener.stop()
+    await order_event_listener.stop()
+    password_hasher.shutdown()
     await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(ReadYourWritesMiddleware)
 app.include_router(order_router)
 app.include_router(product_router)
 app.include_router(auth_router)
+app.include_router(metrics_router)
+app.include_router(courier_router)
+
+engines = {'primary': engine}
+if read_engine is not None:
+    engines['replica'] = read_engine
+    register_stats('db_replica', 'Read replica replication lag', lambda: replica_monitor.stats)
+for db_engine in engines.values():
+    instrument_engine(db_engine)
+register_collector(PoolCollector(engines))
+register_stats('catalog_cache_by_id', 'Product cache by id',
+               lambda: catalog_cache.by_id.stats, counters=('hits', 'misses', 'evictions'))
+register_stats('catalog_cache_by_category', 'Product cache by category name',
+               lambda: catalog_cache.by_category.stats, counters=('hits', 'misses', 'evictions'))
+register_stats('catalog_cache_bodies', 'Serialized catalog responses',
+               lambda: catalog_cache.bodies.stats, counters=('hits', 'misses', 'evictions'))
+register_stats('catalog', 'Catalog version', lambda: catalog_version.stats, counters=('changes',))
+if catalog_snapshot is not None:
+    register_stats('catalog_snapshot', 'Memory-mapped catalog snapshot',
+                   lambda: catalog_snapshot.stats, counters=('builds', 'remaps', 'hits', 'misses'))
+register_stats('token_cache', 'Verified JWT cache',
+               lambda: token_cache.stats, counters=('hits', 'misses', 'evictions'))
+register_stats('order_websockets', 'Order tracking WebSocket manager',
+               lambda: order_connections.stats, counters=('pushes', 'pings', 'stale_closed', 'slow_closed'))
+register_stats('order_outbox', 'Order event outbox dispatcher',
+               lambda: order_outbox.stats, counters=('batches', 'delivered', 'failed', 'parked'))
+register_stats('courier_assignment', 'Courier assignment loop',
+               lambda: courier_assignment.stats, counters=('runs', 'assigned', 'expired'))
+register_stats('order_reads', 'Coalesced reads of an order by id',
+               lambda: order_reads.stats, counters=('executed', 'coalesced'))
+register_stats('order_status_reads', 'Coalesced reads of an order status history',
+               lambda: status_reads.stats, counters=('executed', 'coalesced'))
+register_stats('startup', 'Time spent in each startup phase', lambda: startup.stats)
+register_stats('password_hasher', 'bcrypt worker pool',
+               lambda: password_hasher.stats, counters=('calls', 'rejected', 'wait_seconds', 'run_seconds'))
 
 
 html = """
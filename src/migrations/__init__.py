@@ -0,0 +1,159 @@
+"""Versioned schema migrations.
+
+Every ``mNNNN_<name>.py`` module in this package is a migration with a
+``description``, an ``async def upgrade(conn)`` and a ``transactional`` flag.
+Transactional migrations run inside a transaction together with their
+``schema_version`` row. The others get an autocommit connection, which is what
+``CREATE INDEX CONCURRENTLY`` needs.
+
+``m0001_baseline`` creates fresh databases straight from the models, so later
+migrations must be idempotent (``IF NOT EXISTS`` and friends).
+
+``verify`` is the cheap alternative for app startup once a deploy step has
+run the migrations: one query against ``schema_version``, no DDL, no imports
+of the migration modules.
+"""
+import asyncio
+import importlib
+import logging
+import pkgutil
+from dataclasses import dataclass
+from types import ModuleType
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_LOCK_KEY = 0x6F72646572  # any constant shared by all app instances
+
+create_version_table_stmt = text("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version integer PRIMARY KEY,
+        description text NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    )
+""")
+applied_versions_stmt = text('SELECT version FROM schema_version')
+record_version_stmt = text('INSERT INTO schema_version (version, description) VALUES (:version, :description)')
+index_valid_stmt = text('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)')
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def description(self) -> str:
+        return self.module.description
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, 'transactional', True)
+
+    async def upgrade(self, conn: AsyncConnection):
+        await self.module.upgrade(conn)
+
+
+def _modules() -> list[tuple[int, str, str]]:
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        prefix, _, name = info.name.partition('_')
+        if prefix.startswith('m') and prefix[1:].isdigit():
+            found.append((int(prefix[1:]), name, info.name))
+    return found
+
+
+def discover() -> list[Migration]:
+    migrations = []
+    for version, name, module_name in _modules():
+        module = importlib.import_module(f'{__name__}.{module_name}')
+        migrations.append(Migration(version, name, module))
+
+    migrations.sort(key=lambda x: x.version)
+    versions = [x.version for x in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f'Duplicate migration versions: {versions}')
+    return migrations
+
+
+async def applied_versions(conn: AsyncConnection) -> set[int]:
+    if (await conn.execute(text("SELECT to_regclass('schema_version')"))).scalar() is None:
+        return set()
+    return set((await conn.execute(applied_versions_stmt)).scalars())
+
+
+async def pending(engine: AsyncEngine) -> list[Migration]:
+    async with engine.connect() as conn:
+        applied = await applied_versions(conn)
+    return [x for x in discover() if x.version not in applied]
+
+
+async def verify(engine: AsyncEngine) -> int:
+    """Fails unless every migration this code knows about is applied, returns the schema version.
+
+    Versions newer than the code are fine: migrations are additive, so the
+    previous release keeps serving during a rolling deploy.
+    """
+    async with engine.connect() as conn:
+        applied = await applied_versions(conn)
+
+    missing = sorted({x[0] for x in _modules()} - applied)
+    if missing:
+        raise RuntimeError(f'Database schema is missing migrations {missing}, '
+                           f'run "python -m migrations upgrade" before starting in verify mode')
+    return max(applied)
+
+
+async def upgrade(engine: AsyncEngine, lock_poll_interval: float = 0.5) -> list[Migration]:
+    """Applies pending migrations, one app instance at a time."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        # polling instead of pg_advisory_lock(): a waiter blocked inside a statement
+        # keeps a snapshot open, and CREATE INDEX CONCURRENTLY would wait for it forever
+        while not (await conn.execute(text('SELECT pg_try_advisory_lock(:key)'),
+                                      {'key': MIGRATIONS_LOCK_KEY})).scalar():
+            await asyncio.sleep(lock_poll_interval)
+
+        try:
+            await conn.execute(create_version_table_stmt)
+            applied = await applied_versions(conn)
+            done = []
+            for migration in discover():
+                if migration.version in applied:
+                    continue
+
+                logger.info('Applying migration %04d %s', migration.version, migration.name)
+                if migration.transactional:
+                    async with engine.begin() as tx:
+                        await migration.upgrade(tx)
+                        await _record(tx, migration)
+                else:
+                    await migration.upgrade(conn)
+                    await _record(conn, migration)
+                done.append(migration)
+            return done
+        finally:
+            await conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATIONS_LOCK_KEY})
+
+
+async def _record(conn: AsyncConnection, migration: Migration):
+    await conn.execute(record_version_stmt, {'version': migration.version, 'description': migration.description})
+
+
+async def create_index_concurrently(conn: AsyncConnection, name: str, definition: str):
+    """Builds an index without blocking writes, on an autocommit connection.
+
+    A failed concurrent build leaves an invalid index behind, it is dropped and
+    built again instead of being skipped by ``IF NOT EXISTS``.
+    """
+    valid = (await conn.execute(index_valid_stmt, {'name': name})).scalar()
+    if valid:
+        return
+    if valid is not None:
+        logger.warning('Index %s is invalid, rebuilding it', name)
+        await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+
+    await conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}'))
@@ -0,0 +1,35 @@
+import argparse
+import asyncio
+import logging
+
+from db_config import engine
+from migrations import applied_versions, discover, upgrade
+
+
+async def status():
+    async with engine.connect() as conn:
+        applied = await applied_versions(conn)
+    for migration in discover():
+        mark = 'applied' if migration.version in applied else 'pending'
+        print(f'{migration.version:04d} {migration.name:<24} {mark:<8} {migration.description}')
+
+
+async def main(command: str):
+    try:
+        if command == 'status':
+            await status()
+        else:
+            done = await upgrade(engine)
+            print(f'Applied {len(done)} migrations')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Database schema migrations')
+    parser.add_argument('command', choices=('upgrade', 'status'), nargs='?', default='upgrade')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('sqlalchemy.engine').propagate = False
+    asyncio.run(main(args.command))
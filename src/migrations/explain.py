@@ -0,0 +1,182 @@
+"""Fails when a hot query plans a sequential scan on realistically sized tables.
+
+Seeds synthetic rows inside a transaction, runs the real repository and query
+methods, captures the SQL they send and EXPLAINs each statement. Everything is
+rolled back at the end, so it is safe to point at any migrated database:
+
+    python -m migrations.explain --orders 50000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from typing import Awaitable, Callable
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, async_sessionmaker
+
+from db_config import engine
+from orders.infra.timeline import OrderTimelineProjector
+
+SEED_STATEMENTS = (
+    """INSERT INTO users (user_id, username, user_password, role_id, is_active)
+       SELECT md5('u' || i)::uuid, 'explain_user_' || i, 'x', 3, true
+       FROM generate_series(1, :users) AS i""",
+    """INSERT INTO categories (category_id, category_name)
+       SELECT md5('c' || i)::uuid, 'explain-category-' || i FROM generate_series(1, :categories) AS i""",
+    """INSERT INTO products (product_id, product_name, category_id, price)
+       SELECT md5('p' || i)::uuid, 'explain product ' || i, md5('c' || (i % :categories + 1))::uuid, 100 + i % 900
+       FROM generate_series(1, :categories * 20) AS i""",
+    """INSERT INTO delivery_info (delivery_info_id, address, courier_id)
+       SELECT md5('d' || i)::uuid, 'explain street ' || i,
+              CASE WHEN i % 3 = 0 THEN md5('u' || (i % (:users / 20) + 1) * 20)::uuid END
+       FROM generate_series(1, :orders) AS i""",
+    """INSERT INTO orders (order_id, customer_name, delivery_info_id, data, order_status, created_at, updated_at, version)
+       SELECT md5('o' || i)::uuid, 'explain_user_' || (i % :users + 1), md5('d' || i)::uuid,
+              jsonb_build_object('total_price', 100, 'products', jsonb_build_array(
+                  jsonb_build_object('product_id', md5('p' || (i % (:categories * 20) + 1))::uuid,
+                                     'name', 'explain product', 'quantity', i % 3 + 1, 'price', 100))),
+              (ARRAY['COMPLETED', 'COMPLETED', 'COMPLETED', 'CANCELED', 'CREATED', 'DELIVERING'])[i % 6 + 1],
+              now() - i * interval '1 minute', now() - i * interval '1 minute', 0
+       FROM generate_series(1, :orders) AS i""",
+    """INSERT INTO order_events (order_event_id, order_id, name, data, created_at)
+       SELECT md5('e' || i || '-' || j)::uuid, md5('o' || i)::uuid, 'CreateNewOrder', '{}',
+              now() - i * interval '1 minute' + j * interval '1 second'
+       FROM generate_series(1, :orders) AS i, generate_series(1, 5) AS j""",
+)
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+SEEDED_TABLES = ('users', 'categories', 'products', 'delivery_info', 'orders', 'order_events', 'order_timelines')
+
+
+def hot_paths(session: AsyncSession, orders: int) -> dict[str, Callable[[], Awaitable]]:
+    from datetime import datetime, timedelta, timezone
+    from uuid import UUID
+    import hashlib
+
+    from delivery.infra.repository import DispatchRepository
+    from orders.application.query import OrderQueries
+    from orders.domain.entity import TRANSITIONS
+    from orders.domain.value_obj import ACTIVE_STATUSES
+    from orders.infra.event_store import OrderEventStore
+    from orders.infra.repository import OrderRepository
+    from products.infra.cache import catalog_cache
+    from products.infra.repository import ProductRepository
+    from user.infra.repository import UserRepository
+
+    def seeded_uuid(key: str) -> UUID:
+        return UUID(hashlib.md5(key.encode()).hexdigest())
+
+    order_id = seeded_uuid(f'o{orders // 2}')
+    now = datetime.now(timezone.utc)
+    cursor = (now, seeded_uuid('o1'))
+    queries = OrderQueries(session)
+    repository = OrderRepository(OrderEventStore(session), session)
+    products = ProductRepository(session)
+    catalog_cache.clear()
+
+    return {
+        'user by name': lambda: UserRepository(session).get_by_name('explain_user_7'),
+        'products by category': lambda: products.get_products_by_category_name('explain-category-3'),
+        'products by ids': lambda: products.get_many_by_ids([seeded_uuid('p5'), seeded_uuid('p6')]),
+        'order by id': lambda: repository.get_by_id(order_id),
+        'order from events': lambda: repository.load_from_events(order_id),
+        'order statuses': lambda: queries.get_statuses(order_id),
+        'order timeline': lambda: queries.get_timeline(order_id),
+        'my orders': lambda: queries.get_orders_by_username('explain_user_7'),
+        'my active orders': lambda: queries.get_orders_by_username('explain_user_7', statuses=ACTIVE_STATUSES),
+        'my orders after cursor': lambda: queries.get_orders_by_username('explain_user_7', cursor),
+        'all orders first page': lambda: queries.get_page_after(None),
+        'all orders after cursor': lambda: queries.get_page_after(cursor),
+        'orders with product': lambda: queries.get_orders_with_product(seeded_uuid('p5'), now - timedelta(days=30), now),
+        'top products of a day': lambda: queries.get_top_products(now - timedelta(days=1), now),
+        'ready orders to dispatch': lambda: DispatchRepository(session).lock_unassigned(200),
+        'busy couriers': lambda: DispatchRepository(session).busy_couriers(),
+        'transit order': lambda: repository.transit_status(order_id, TRANSITIONS['begin']),
+    }
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def seed(conn: AsyncConnection, orders: int, users: int, categories: int) -> dict[str, int]:
+    params = {'orders': orders, 'users': users, 'categories': categories}
+    for stmt in SEED_STATEMENTS:
+        await conn.execute(text(stmt), params)
+    await OrderTimelineProjector(async_sessionmaker(bind=conn, join_transaction_mode='create_savepoint'),
+                                 batch_size=orders).rebuild()
+    for table in SEEDED_TABLES:
+        await conn.execute(text(f'ANALYZE {table}'))
+
+    res = await conn.execute(text('SELECT relname, relpages FROM pg_class WHERE relname = ANY(:tables)'),
+                             {'tables': list(SEEDED_TABLES)})
+    return dict(res.all())
+
+
+async def check(orders: int, users: int, categories: int, min_pages: int) -> list[str]:
+    failures = []
+    captured: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    async with engine.connect() as conn:
+        async with conn.begin() as tx:
+            pages = await seed(conn, orders, users, categories)
+            session = AsyncSession(bind=conn, join_transaction_mode='create_savepoint')
+
+            for name, run in hot_paths(session, orders).items():
+                captured.clear()
+                event.listen(engine.sync_engine, 'before_cursor_execute', capture)
+                try:
+                    await run()
+                finally:
+                    event.remove(engine.sync_engine, 'before_cursor_execute', capture)
+
+                for statement, parameters in list(captured):
+                    if statement.split(None, 1)[0].upper() not in EXPLAINABLE:
+                        continue
+                    res = await conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}', parameters)
+                    plan = res.scalar()
+                    plan = json.loads(plan) if isinstance(plan, str) else plan
+                    # scanning a table of a few pages is the right plan, not a missing index
+                    scans = [x for x in seq_scans(plan[0]['Plan']) if pages.get(x, 0) > min_pages]
+                    verdict = 'SEQ SCAN on ' + ', '.join(scans) if scans else 'ok'
+                    print(f'{name:<26} {verdict:<36} {" ".join(statement.split())[:90]}')
+                    if scans:
+                        failures.append(name)
+
+            await tx.rollback()
+
+    return failures
+
+
+async def main(args) -> int:
+    try:
+        failures = await check(args.orders, args.users, args.categories, args.min_pages)
+    finally:
+        await engine.dispose()
+
+    if failures:
+        print(f'Hot queries falling back to sequential scans: {", ".join(sorted(set(failures)))}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EXPLAIN the hot queries on seeded data')
+    parser.add_argument('--orders', type=int, default=50_000)
+    parser.add_argument('--users', type=int, default=2_000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--min-pages', type=int, default=8,
+                        help='sequential scans of tables up to this many pages are accepted')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    sys.exit(asyncio.run(main(args)))
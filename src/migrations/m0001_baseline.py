@@ -0,0 +1,8 @@
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+description = 'Create missing tables from the models'
+
+
+async def upgrade(conn: AsyncConnection):
+    import models
+    await conn.run_sync(models.Base.metadata.create_all)
@@ -0,0 +1,8 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+description = 'Add the optimistic locking version to orders'
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.execute(text('ALTER TABLE orders ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 0'))
@@ -0,0 +1,24 @@
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from migrations import create_index_concurrently
+
+description = 'Index the columns the repository queries filter and sort on'
+transactional = False
+
+INDEXES = {
+    'ix_orders_updated_at_order_id': 'orders (updated_at DESC, order_id DESC)',
+    'ix_orders_customer_name_created_at': 'orders (customer_name, created_at DESC, order_id DESC)',
+    'ix_orders_active_customer_name_created_at':
+        'orders (customer_name, created_at DESC, order_id DESC) '
+        "WHERE order_status IN ('CREATED', 'STARTED', 'READY_TO_DELIVERY', 'DELIVERING')",
+    'ix_order_events_order_id_created_at': 'order_events (order_id, created_at, order_event_id)',
+    'ix_categories_category_name': 'categories (category_name)',
+    'ix_products_category_id': 'products (category_id)',
+    'ix_delivery_info_courier_id': 'delivery_info (courier_id)',
+    'ix_users_username': 'users (username)',
+}
+
+
+async def upgrade(conn: AsyncConnection):
+    for name, definition in INDEXES.items():
+        await create_index_concurrently(conn, name, definition)
@@ -0,0 +1,15 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+description = 'Store the order payload as JSONB'
+
+column_type_stmt = text("""
+    SELECT data_type FROM information_schema.columns
+    WHERE table_name = 'orders' AND column_name = 'data'
+""")
+
+
+async def upgrade(conn: AsyncConnection):
+    # rewrites the table under an exclusive lock, run it in a quiet window on big databases
+    if (await conn.execute(column_type_stmt)).scalar() == 'json':
+        await conn.execute(text('ALTER TABLE orders ALTER COLUMN data TYPE jsonb USING data::jsonb'))
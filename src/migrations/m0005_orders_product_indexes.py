@@ -0,0 +1,16 @@
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from migrations import create_index_concurrently
+
+description = 'Index order payloads for product queries and orders by creation time'
+transactional = False
+
+INDEXES = {
+    'ix_orders_data': 'orders USING gin (data jsonb_path_ops)',
+    'ix_orders_created_at_order_id': 'orders (created_at DESC, order_id DESC)',
+}
+
+
+async def upgrade(conn: AsyncConnection):
+    for name, definition in INDEXES.items():
+        await create_index_concurrently(conn, name, definition)
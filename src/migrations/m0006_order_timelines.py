@@ -0,0 +1,12 @@
+from sqlalchemy.ext.asyncio import AsyncConnection, async_sessionmaker
+
+description = 'Project order events onto per-order timelines'
+
+
+async def upgrade(conn: AsyncConnection):
+    from models import OrderTimeline
+    from orders.infra.timeline import OrderTimelineProjector
+
+    await conn.run_sync(OrderTimeline.__table__.create, checkfirst=True)
+    sessions = async_sessionmaker(bind=conn, join_transaction_mode='create_savepoint')
+    await OrderTimelineProjector(sessions).rebuild()
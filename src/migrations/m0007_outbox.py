@@ -0,0 +1,8 @@
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+description = 'Add the transactional outbox for domain events'
+
+
+async def upgrade(conn: AsyncConnection):
+    from models import OutboxMessage
+    await conn.run_sync(OutboxMessage.__table__.create, checkfirst=True)
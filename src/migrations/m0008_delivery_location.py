@@ -0,0 +1,16 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from migrations import create_index_concurrently
+
+description = 'Store delivery coordinates and index orders waiting for a courier'
+transactional = False
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.execute(text('ALTER TABLE delivery_info ADD COLUMN IF NOT EXISTS latitude double precision'))
+    await conn.execute(text('ALTER TABLE delivery_info ADD COLUMN IF NOT EXISTS longitude double precision'))
+    await create_index_concurrently(conn, 'ix_orders_ready_to_delivery_updated_at',
+                                    "orders (updated_at) WHERE order_status = 'READY_TO_DELIVERY'")
+    await create_index_concurrently(conn, 'ix_orders_with_courier_delivery_info_id',
+                                    "orders (delivery_info_id) WHERE order_status IN ('READY_TO_DELIVERY', 'DELIVERING')")
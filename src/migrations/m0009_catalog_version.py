@@ -0,0 +1,34 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+description = 'Version the catalog on every product and category write'
+
+CATALOG_TABLES = ('products', 'categories')
+
+create_row_stmt = text('INSERT INTO catalog_meta (id) VALUES (1) ON CONFLICT (id) DO NOTHING')
+# statement level, so a bulk import bumps the version once per statement rather than per row
+create_function_stmt = text("""
+    CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+    DECLARE
+        new_version bigint;
+    BEGIN
+        UPDATE catalog_meta SET version = version + 1, updated_at = now() WHERE id = 1
+        RETURNING version INTO new_version;
+        PERFORM pg_notify('catalog_changed', new_version::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+""")
+
+
+async def upgrade(conn: AsyncConnection):
+    from models import CatalogMeta
+
+    await conn.run_sync(CatalogMeta.__table__.create, checkfirst=True)
+    await conn.execute(create_row_stmt)
+    await conn.execute(create_function_stmt)
+    for table in CATALOG_TABLES:
+        await conn.execute(text(f'DROP TRIGGER IF EXISTS {table}_catalog_version ON {table}'))
+        await conn.execute(text(f'CREATE TRIGGER {table}_catalog_version '
+                                f'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} '
+                                f'FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version()'))
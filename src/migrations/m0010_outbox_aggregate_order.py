@@ -0,0 +1,11 @@
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from migrations import create_index_concurrently
+
+description = 'Index outbox messages by aggregate for in-order claiming'
+transactional = False
+
+
+async def upgrade(conn: AsyncConnection):
+    await create_index_concurrently(conn, 'ix_outbox_aggregate_id_created_at',
+                                    'outbox (aggregate_id, created_at, message_id)')
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, Float, String, Boolean, ForeignKey, DateTime, JSON, UUID
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Boolean, ForeignKey, DateTime, JSON, UUID, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from db_config import Base
+from orders.domain.value_obj import ACTIVE_STATUSES, COURIER_STATUSES, Status
 
 
 class User(Base):
@@ -14,6 +16,9 @@ class User(Base):
     is_active = Column(Boolean)
 
 
+Index('ix_users_username', User.username)
+
+
 class Product(Base):
     __tablename__ = 'products'
 
@@ -23,6 +28,9 @@ class Product(Base):
     category_id = Column(UUID, ForeignKey('categories.category_id'))
 
 
+Index('ix_products_category_id', Product.category_id)
+
+
 class Category(Base):
     __tablename__ = 'categories'
 
@@ -30,20 +38,45 @@ class Category(Base):
     category_name = Column(String)
 
 
+Index('ix_categories_category_name', Category.category_name)
+
+
+class CatalogMeta(Base):
+    """A single row whose version is bumped by triggers on every products/categories write."""
+    __tablename__ = 'catalog_meta'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default='1')
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
 class Order(Base):
     __tablename__ = 'orders'
 
     id = Column('order_id', UUID, primary_key=True)
     customer_name = Column(String, nullable=False)
     delivery_info_id = Column(UUID, ForeignKey('delivery_info.delivery_info_id'), nullable=False)
-    data = Column(JSON)
+    data = Column(JSONB)
     order_status = Column(String)
     created_at = Column(DateTime(timezone=True))
     updated_at = Column(DateTime(timezone=True))
+    version = Column(Integer, nullable=False, default=0, server_default='0')
 
     delivery_info = relationship('DeliveryInfo', back_populates='order', lazy="joined")
 
 
+Index('ix_orders_updated_at_order_id', Order.updated_at.desc(), Order.id.desc())
+Index('ix_orders_customer_name_created_at', Order.customer_name, Order.created_at.desc(), Order.id.desc())
+Index('ix_orders_active_customer_name_created_at', Order.customer_name, Order.created_at.desc(), Order.id.desc(),
+      postgresql_where=Order.order_status.in_([x.value for x in ACTIVE_STATUSES]))
+Index('ix_orders_created_at_order_id', Order.created_at.desc(), Order.id.desc())
+Index('ix_orders_data', Order.data, postgresql_using='gin', postgresql_ops={'data': 'jsonb_path_ops'})
+Index('ix_orders_ready_to_delivery_updated_at', Order.updated_at,
+      postgresql_where=Order.order_status == Status.READY_TO_DELIVERY.value)
+Index('ix_orders_with_courier_delivery_info_id', Order.delivery_info_id,
+      postgresql_where=Order.order_status.in_([x.value for x in COURIER_STATUSES]))
+
+
 class OrderEvent(Base):
     __tablename__ = 'order_events'
 
@@ -54,14 +87,67 @@ class OrderEvent(Base):
     created_at = Column(DateTime(timezone=True))
 
 
+Index('ix_order_events_order_id_created_at', OrderEvent.order_id, OrderEvent.created_at, OrderEvent.id)
+
+
+class OrderSnapshot(Base):
+    __tablename__ = 'order_snapshots'
+
+    order_id = Column(UUID, ForeignKey('orders.order_id'), primary_key=True)
+    version = Column(Integer, nullable=False)
+    last_event_id = Column(UUID, nullable=False)
+    last_event_at = Column(DateTime(timezone=True), nullable=False)
+    data = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True))
+
+
+class OrderTimeline(Base):
+    __tablename__ = 'order_timelines'
+
+    order_id = Column(UUID, ForeignKey('orders.order_id'), primary_key=True)
+    order_status = Column(String)
+    created_at = Column(DateTime(timezone=True))
+    started_at = Column(DateTime(timezone=True))
+    ready_to_delivery_at = Column(DateTime(timezone=True))
+    delivering_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    canceled_at = Column(DateTime(timezone=True))
+    last_event_id = Column(UUID, nullable=False)
+    last_event_at = Column(DateTime(timezone=True), nullable=False)
+    history = Column(JSONB, nullable=False)
+
+
+class OutboxMessage(Base):
+    __tablename__ = 'outbox'
+
+    id = Column('message_id', UUID, primary_key=True)
+    aggregate_id = Column(UUID, nullable=False)
+    name = Column(String, nullable=False)
+    payload = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    available_at = Column(DateTime(timezone=True), server_default=func.now())
+    attempts = Column(Integer, nullable=False, server_default='0')
+    last_error = Column(String)
+
+
+Index('ix_outbox_available_at', OutboxMessage.available_at, OutboxMessage.created_at,
+      postgresql_where=OutboxMessage.available_at.is_not(None))
+Index('ix_outbox_aggregate_id_created_at', OutboxMessage.aggregate_id, OutboxMessage.created_at, OutboxMessage.id)
+
+
 class DeliveryInfo(Base):
     __tablename__ = 'delivery_info'
 
     id = Column('delivery_info_id', UUID, primary_key=True)
     address = Column(String)
     courier_id = Column(UUID, ForeignKey('users.user_id'))
+    latitude = Column(Float)
+    longitude = Column(Float)
 
     order = relationship('Order', back_populates='delivery_info')
 
+
+Index('ix_delivery_info_courier_id', DeliveryInfo.courier_id)
+
 # Base.metadata.create_all(bind=engine)
 
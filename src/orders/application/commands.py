@@ -1,17 +1,24 @@
-from contextlib import asynccontextmanager
+import os
+from typing import Mapping
 
 from fastapi import Depends
+from starlette.exceptions import HTTPException
 
 from orders.infra.repository import OrderRepository
 from products.infra.repository import ProductRepository
+from products.domain.entity import ProductEntity
 from orders.domain.value_obj import OrderItem
-from orders.domain.entity import OrderEntity
+from orders.domain.entity import OrderEntity, TRANSITIONS
 from orders.domain.events import AddItemsToOrder
-from orders.domain.schemas import OrderReq, OrderItemReq, OrderUpdate
+from orders.domain.schemas import OrderReq, OrderItemReq, OrderUpdate, OrderTransitionReq
+from shared.infra.metrics import ORDER_STATUS_TRANSITIONS
 
 from uuid import UUID
 
-from ..domain.exceptions import OrderNotFoundException
+from exceptions import BatchTooLargeError
+from ..domain.exceptions import OrderNotFoundException, OrderVersionConflictError, UnknownOrderActionError
+
+ORDERS_BATCH_LIMIT = int(os.getenv('ORDERS_BATCH_LIMIT', 500))
 
 
 class OrderCommands:
@@ -24,23 +31,53 @@ class OrderCommands:
 
     async def create_new(self, _input: OrderReq) -> OrderEntity:
         items = await self.form_items(_input.items)
-        order = OrderEntity.create(_input.customer_name,
-                                   _input.address,
-                                   items)
-        order.calc_total_price()
-        order.events.append(AddItemsToOrder(order.id, data=order.items_as_model_data))
+        order = self._new_order(_input, items)
 
         await self._order_repo.add(order)
         await self._order_repo.commit()
 
         return order
 
+    async def create_batch(self, _input: list[OrderReq]) -> list[dict]:
+        if len(_input) > ORDERS_BATCH_LIMIT:
+            raise BatchTooLargeError(ORDERS_BATCH_LIMIT)
+
+        product_ids = {item.id for order in _input for item in order.items}
+        products = {p.id: p for p in await self._product_repo.get_many_by_ids(product_ids)}
+
+        results, orders = [], []
+        for index, order_req in enumerate(_input):
+            errors = self.validate_items(order_req.items, products)
+            if errors:
+                results.append({'index': index, 'order_id': None, 'errors': errors})
+                continue
+
+            order = self._new_order(order_req, self.build_items(order_req.items, products))
+            orders.append(order)
+            results.append({'index': index, 'order_id': order.id, 'errors': []})
+
+        if orders:
+            await self._order_repo.add_many(orders)
+            await self._order_repo.commit()
+
+        return results
+
+    @staticmethod
+    def _new_order(_input: OrderReq, items: list[OrderItem]) -> OrderEntity:
+        order = OrderEntity.create(_input.customer_name,
+                                   _input.address,
+                                   items,
+                                   _input.latitude,
+                                   _input.longitude)
+        order.calc_total_price()
+        order.events.append(AddItemsToOrder(order.id, data=order.items_as_model_data))
+        return order
+
     async def update(self, order_id: UUID, _input: OrderUpdate):
-        order = await self._order_repo.get_by_id(order_id)
+        order = await self._order_repo.get_entity(order_id)
         if order is None:
             raise OrderNotFoundException
 
-        order = self._order_repo.map_model(order)
         if _input.items:
             new_items = await self.form_items(_input.items)
             order.update_items(new_items)
@@ -49,6 +86,7 @@ class OrderCommands:
         if _input.address:
             order.update_address(_input.address)
             await self._order_repo.change_delivery_info(order.delivery_info)
+            await self._order_repo.save_events(order)
 
         await self._order_repo.commit()
 
@@ -70,14 +108,91 @@ class OrderCommands:
             )
         return new_items
 
-    @asynccontextmanager
-    async def wrapper(self, order_id: UUID) -> OrderEntity:
+    @staticmethod
+    def validate_items(items: list[OrderItemReq], products: Mapping[UUID, ProductEntity]) -> list[str]:
+        if not items:
+            return ['Order has no items']
+
+        errors, seen = [], set()
+        for item in items:
+            if item.id not in products:
+                errors.append(f'Product {item.id} is absent')
+            if item.id in seen:
+                errors.append(f'Product {item.id} is listed more than once')
+            if item.quantity < 1:
+                errors.append(f'Quantity of product {item.id} must be positive')
+            seen.add(item.id)
+        return errors
+
+    @staticmethod
+    def build_items(items: list[OrderItemReq], products: Mapping[UUID, ProductEntity]) -> list[OrderItem]:
+        return [OrderItem(x.id,
+                          products[x.id].product_name,
+                          x.quantity,
+                          products[x.id].price) for x in items]
+
+    async def transit(self, order_id: UUID, action: str, expected_version: int | None = None) -> int:
+        transition = TRANSITIONS[action]
+        version = await self._order_repo.transit_status(order_id, transition, expected_version)
+        if version is None:
+            await self._raise_transition_error(order_id, action, expected_version)
+
+        await self._order_repo.commit()
+        ORDER_STATUS_TRANSITIONS.labels(transition.new).inc()
+        return version
+
+    async def transit_many(self, _input: list[OrderTransitionReq]) -> list[dict]:
+        """Applies the transitions in request order within one transaction.
+
+        Every pair is checked against the order state machine after the pairs
+        before it, so ``begin`` followed by ``ready`` of one order works. Failed
+        pairs are reported and skipped, the rest are written set-based.
+        """
+        if len(_input) > ORDERS_BATCH_LIMIT:
+            raise BatchTooLargeError(ORDERS_BATCH_LIMIT)
+
+        orders = await self._order_repo.lock_entities(x.order_id for x in _input)
+        locked_versions = {x.id: x.version for x in orders.values()}
+
+        results, changed = [], {}
+        for index, item in enumerate(_input):
+            result = {'index': index, 'order_id': item.order_id, 'action': item.action, 'errors': []}
+            results.append(result)
+
+            order = orders.get(item.order_id)
+            try:
+                if item.action not in TRANSITIONS:
+                    raise UnknownOrderActionError(item.action)
+                if order is None:
+                    raise OrderNotFoundException
+                if item.version is not None and item.version != locked_versions[order.id]:
+                    raise OrderVersionConflictError
+                order.transit(item.action)
+            except HTTPException as e:
+                result['errors'].append(e.detail)
+                continue
+
+            order.version += 1
+            changed[order.id] = order
+            result.update(order_status=str(order.status), version=order.version)
+
+        if changed:
+            await self._order_repo.change_statuses(list(changed.values()))
+            await self._order_repo.commit()
+            for result in results:
+                if not result['errors']:
+                    ORDER_STATUS_TRANSITIONS.labels(result['order_status']).inc()
+
+        return results
+
+    async def _raise_transition_error(self, order_id: UUID, action: str, expected_version: int | None):
         order = await self._order_repo.get_by_id(order_id)
         if order is None:
             raise OrderNotFoundException
 
         order = self._order_repo.map_model(order)
-        yield order
+        if expected_version is not None and order.version != expected_version:
+            raise OrderVersionConflictError
 
-        await self._order_repo.change_status(order)
-        await self._order_repo.commit()
+        order.transit(action)
+        raise OrderVersionConflictError
@@ -1,37 +1,140 @@
+import os
+from datetime import datetime
 from typing import Any, Sequence
 from uuid import UUID
 
 from fastapi import Depends
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select
+from sqlalchemy import Float, Integer, Row, bindparam, column, func, select, true, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db_config import get_session
-from models import OrderEvent, Order
+from db_config import get_read_session, last_write_at
+from models import DeliveryInfo, Order, OrderTimeline
+from orders.domain.value_obj import Status
+from orders.infra.timeline import STATUS_COLUMNS
+from shared.infra.singleflight import SingleFlight
+
+ORDERS_PAGE_SIZE = int(os.getenv('ORDERS_PAGE_SIZE', 10))
+ORDERS_MAX_PAGE_SIZE = int(os.getenv('ORDERS_MAX_PAGE_SIZE', 100))
+TOP_PRODUCTS_MAX_LIMIT = int(os.getenv('TOP_PRODUCTS_MAX_LIMIT', 100))
+
+USER_ORDER_COLUMNS = (Order.id, Order.order_status, Order.data, Order.created_at, Order.updated_at,
+                      DeliveryInfo.address)
+ORDER_COLUMNS = USER_ORDER_COLUMNS + (DeliveryInfo.id.label('delivery_info_id'), DeliveryInfo.courier_id,
+                                      Order.customer_name, Order.version)
+status_reads = SingleFlight()
+
+TIMELINE_COLUMNS = (OrderTimeline.order_id, OrderTimeline.order_status,
+                    *(getattr(OrderTimeline, x) for x in STATUS_COLUMNS.values()),
+                    OrderTimeline.last_event_id, OrderTimeline.last_event_at)
 
 
 class OrderQueries:
 
-    def __init__(self, db: AsyncSession = Depends(get_session)):
+    def __init__(self, db: AsyncSession = Depends(get_read_session)):
         self._db = db
 
-    async def get_statuses(self, order_id: UUID) -> list:
-        stmt = select(OrderEvent.name, OrderEvent.created_at).where(OrderEvent.order_id == order_id)
-        res = await self._db.stream(stmt)
+    async def get_statuses(self, order_id: UUID, coalesce: bool = False, since: float | None = None) -> list:
+        """``coalesce`` shares one query with concurrent readers of the same order that started
+        no earlier than ``since`` (``time.time()``) and the caller's last commit."""
+        if coalesce:
+            not_before = max(filter(None, (since, last_write_at(self._db))), default=None)
+            # replica and primary reads are never shared, a recent writer on the primary must not get replica data
+            key = (order_id, self._db.bind)
+            statuses = await status_reads.run(key, lambda: self.get_statuses(order_id), not_before)
+            return list(statuses)
+
+        stmt = select(OrderTimeline.history).where(OrderTimeline.order_id == order_id)
+        res = await self._db.execute(stmt)
+
+        return res.scalar_one_or_none() or []
+
+    async def get_timeline(self, order_id: UUID) -> Row | None:
+        stmt = select(*TIMELINE_COLUMNS, Order.customer_name) \
+            .join(Order, Order.id == OrderTimeline.order_id) \
+            .where(OrderTimeline.order_id == order_id)
+        res = await self._db.execute(stmt)
+
+        return res.one_or_none()
+
+    async def get_orders_by_username(self,
+                                     username: str,
+                                     cursor: tuple[datetime, UUID] | None = None,
+                                     statuses: Sequence[str] = (),
+                                     page_size: int = ORDERS_PAGE_SIZE) -> list[Row]:
+        stmt = select(*USER_ORDER_COLUMNS).join(Order.delivery_info) \
+            .where(Order.customer_name == username) \
+            .order_by(Order.created_at.desc(), Order.id.desc()).limit(page_size + 1)
+        if statuses:
+            # inlined so that the planner can match the partial index on active orders
+            stmt = stmt.where(Order.order_status.in_(bindparam('statuses', sorted(str(x) for x in statuses),
+                                                               expanding=True, literal_execute=True)))
+        if cursor is not None:
+            stmt = stmt.where(tuple_(Order.created_at, Order.id) < cursor)
+        res = await self._db.execute(stmt)
+
+        return list(res.all())
+
+    async def get_by_pages(self, page: int, page_size: int = ORDERS_PAGE_SIZE) -> list[Row]:
+        offset = (page - 1) * page_size
+        stmt = select(*ORDER_COLUMNS).join(Order.delivery_info) \
+            .order_by(Order.updated_at.desc(), Order.id.desc()) \
+            .offset(offset).limit(page_size + 1)
+        res = await self._db.execute(stmt)
+
+        return list(res.all())
+
+    async def get_page_after(self,
+                             cursor: tuple[datetime, UUID] | None,
+                             page_size: int = ORDERS_PAGE_SIZE) -> list[Row]:
+        stmt = select(*ORDER_COLUMNS).join(Order.delivery_info) \
+            .order_by(Order.updated_at.desc(), Order.id.desc()).limit(page_size + 1)
+        if cursor is not None:
+            stmt = stmt.where(tuple_(Order.updated_at, Order.id) < cursor)
+        res = await self._db.execute(stmt)
 
-        return [jsonable_encoder(event) async for event in res.mappings()]
+        return list(res.all())
 
-    async def get_orders_by_username(self, username: str) -> Sequence[Order]:
-        stmt = select(Order).where(Order.customer_name == username).\
-                             order_by(Order.created_at.desc())
+    async def get_orders_with_product(self,
+                                      product_id: UUID,
+                                      since: datetime,
+                                      until: datetime,
+                                      cursor: tuple[datetime, UUID] | None = None,
+                                      page_size: int = ORDERS_PAGE_SIZE) -> list[Row]:
+        """Orders created in ``[since, until)`` with the product among their items, newest first."""
+        contains = Order.data.contains({'products': [{'product_id': str(product_id)}]})
+        stmt = select(*ORDER_COLUMNS).join(Order.delivery_info) \
+            .where(contains, Order.created_at >= since, Order.created_at < until) \
+            .order_by(Order.created_at.desc(), Order.id.desc()).limit(page_size + 1)
+        if cursor is not None:
+            stmt = stmt.where(tuple_(Order.created_at, Order.id) < cursor)
         res = await self._db.execute(stmt)
 
-        return res.scalars().all()
+        return list(res.all())
 
-    async def get_by_pages(self, page: int) -> Sequence[Order]:
-        offset = (page - 1) * 10
-        limit = offset + 11
-        stmt = select(Order).offset(offset).limit(limit).order_by(Order.updated_at.desc())
+    async def get_top_products(self, since: datetime, until: datetime, limit: int = 10) -> Sequence[Row]:
+        """Products of the orders created in ``[since, until)`` ranked by ordered quantity, canceled orders excluded."""
+        elements = func.jsonb_array_elements(Order.data['products']).table_valued(column('value', JSONB)) \
+            .lateral('item')
+        item = elements.c.value
+        items = select(Order.id.label('order_id'),
+                       item['product_id'].astext.label('product_id'),
+                       item['name'].astext.label('name'),
+                       item['quantity'].astext.cast(Integer).label('quantity'),
+                       item['price'].astext.cast(Float).label('price')) \
+            .select_from(Order).join(elements, true()) \
+            .where(Order.created_at >= since, Order.created_at < until,
+                   Order.order_status != Status.CANCELED.value) \
+            .subquery('items')
+        quantity = func.sum(items.c.quantity).label('quantity')
+        stmt = select(items.c.product_id,
+                      func.max(items.c.name).label('name'),
+                      quantity,
+                      func.count(items.c.order_id.distinct()).label('orders'),
+                      func.sum(items.c.quantity * items.c.price).label('revenue')) \
+            .group_by(items.c.product_id) \
+            .order_by(quantity.desc(), items.c.product_id) \
+            .limit(limit)
         res = await self._db.execute(stmt)
 
-        return res.scalars().all()
+        return res.all()
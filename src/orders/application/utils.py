@@ -1,6 +1,19 @@
+import base64
+from datetime import datetime
+from uuid import UUID
 
-def check_new_events(events: list, cache: list | None) -> list:
-    if cache is None or len(cache) == 0:
-        return events
+from exceptions import InvalidCursorError
 
-    return [ev for ev in events if ev not in cache]
+
+def encode_cursor(sort_value: datetime, _id: UUID) -> str:
+    raw = f'{sort_value.isoformat()}|{_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        sort_value, _id = raw.split('|')
+        return datetime.fromisoformat(sort_value), UUID(_id)
+    except ValueError:
+        raise InvalidCursorError()
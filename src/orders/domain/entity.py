@@ -1,4 +1,6 @@
 from datetime import datetime
+from typing import Iterable, Mapping, Optional
+from uuid import UUID
 
 from shared.domain.entity import EntityId, Entity, AggregateRoot
 from shared.domain.events import DomainEvent
@@ -13,6 +15,24 @@ from dataclasses import dataclass, field
 class DeliveryInfoEntity(Entity):
     address: str
     courier_id: int = None
+    latitude: float | None = None
+    longitude: float | None = None
+
+    def as_dict(self) -> dict:
+        return {'id': str(self.id),
+                'address': self.address,
+                'courier_id': str(self.courier_id) if self.courier_id else None,
+                'latitude': self.latitude,
+                'longitude': self.longitude}
+
+    @classmethod
+    def from_dict(cls, data: Mapping):
+        courier_id = data.get('courier_id')
+        return cls(id=UUID(data['id']),
+                   address=data['address'],
+                   courier_id=UUID(courier_id) if courier_id else None,
+                   latitude=data.get('latitude'),
+                   longitude=data.get('longitude'))
 
 
 @dataclass
@@ -24,23 +44,82 @@ class OrderEntity(AggregateRoot):
     created_at: datetime
     updated_at: datetime
     total_price: float = 0.0
+    version: int = 0
 
     events: list[DomainEvent] = field(default_factory=list, compare=False)
 
     @classmethod
-    def create(cls, customer_name: str, address: str, items: list):
+    def create(cls, customer_name: str, address: str, items: list,
+               latitude: float | None = None, longitude: float | None = None):
         new_id = EntityId.next_id()
         time_now = datetime.utcnow()
-        ev = [events.CreateNewOrder(new_id)]
+        delivery_info = DeliveryInfoEntity(id=EntityId.next_id(),
+                                           address=address,
+                                           latitude=latitude,
+                                           longitude=longitude)
+        ev = events.CreateNewOrder(new_id, data={'customer_name': customer_name,
+                                                 'delivery_info': delivery_info.as_dict()})
+        ev.created_at = time_now
         return cls(id=new_id,
                    customer_name=customer_name,
-                   delivery_info=DeliveryInfoEntity(id=EntityId.next_id(),
-                                                    address=address),
+                   delivery_info=delivery_info,
                    order_items=items,
                    status=Status.CREATED,
                    created_at=time_now,
                    updated_at=time_now,
-                   events=ev)
+                   events=[ev])
+
+    @classmethod
+    def replay(cls, order_id: EntityId, history: Iterable[tuple[str, Mapping | None, datetime]],
+               snapshot: 'OrderEntity' = None) -> Optional['OrderEntity']:
+        order = snapshot
+        for name, data, created_at in history:
+            if order is None:
+                if name != events.CreateNewOrder.__name__ or not data:
+                    return None
+                order = cls(id=order_id,
+                            customer_name=data['customer_name'],
+                            delivery_info=DeliveryInfoEntity.from_dict(data['delivery_info']),
+                            order_items=[],
+                            status=Status.CREATED,
+                            created_at=created_at,
+                            updated_at=created_at)
+            else:
+                order.apply(name, data, created_at)
+        return order
+
+    def apply(self, name: str, data: Mapping | None, created_at: datetime):
+        if name in STATUS_BY_EVENT:
+            self.status = STATUS_BY_EVENT[name]
+            self.updated_at = created_at
+        elif name in (events.AddItemsToOrder.__name__, events.UpdateOrderItems.__name__):
+            self.order_items = [OrderItem(**x) for x in data['products']]
+            self.total_price = data.get('total_price', 0.0)
+            self.updated_at = created_at
+        elif name == events.UpdateOrderAddress.__name__:
+            self.delivery_info.address = data['address']
+        elif name == events.CourierAssigned.__name__:
+            self.delivery_info.courier_id = UUID(data['courier_id'])
+
+    def as_snapshot(self) -> dict:
+        return {'customer_name': self.customer_name,
+                'delivery_info': self.delivery_info.as_dict(),
+                'data': self.items_as_model_data,
+                'status': str(self.status),
+                'created_at': self.created_at.isoformat(),
+                'updated_at': self.updated_at.isoformat()}
+
+    @classmethod
+    def from_snapshot(cls, order_id: EntityId, snapshot: Mapping) -> 'OrderEntity':
+        data = snapshot['data']
+        return cls(id=order_id,
+                   customer_name=snapshot['customer_name'],
+                   delivery_info=DeliveryInfoEntity.from_dict(snapshot['delivery_info']),
+                   order_items=[OrderItem(**x) for x in data['products']],
+                   total_price=data.get('total_price', 0.0),
+                   status=Status(snapshot['status']),
+                   created_at=datetime.fromisoformat(snapshot['created_at']),
+                   updated_at=datetime.fromisoformat(snapshot['updated_at']))
 
     @property
     def items_as_model_data(self) -> dict:
@@ -75,36 +154,66 @@ class OrderEntity(AggregateRoot):
             raise InappropriateOrderStatusError
 
         self.delivery_info.address = new_address
+        self.events.append(
+            events.UpdateOrderAddress(self.id, data={'address': new_address})
+        )
 
-    def _transit_status(self, new: Status, expected: Status):
-        if self.status != expected:
-            raise OrderStatusTransitionError(new, self.status, expected)
-        self.status = new
-        self.update_time()
+    def can_transit(self, action: str) -> bool:
+        transition = TRANSITIONS[action]
+        if transition.requires_items and not self.has_items:
+            return False
+        return self.status in transition.allowed_from
 
-    def begin(self):
-        if not self.order_items or self.total_price < 1:
+    def transit(self, action: str):
+        transition = TRANSITIONS[action]
+        if transition.requires_items and not self.has_items:
             raise NoItemsInOrderError
+        if self.status not in transition.allowed_from:
+            raise OrderStatusTransitionError(transition.new, self.status, transition.expected)
 
-        self._transit_status(Status.STARTED, Status.CREATED)
-        self.events.append(events.StartOrder(self.id))
+        self.status = transition.new
+        self.update_time()
+        self.events.append(transition.event(self.id))
+
+    @property
+    def has_items(self) -> bool:
+        return bool(self.order_items) and self.total_price >= 1
+
+    def begin(self):
+        self.transit('begin')
 
     def ready(self):
-        self._transit_status(Status.READY_TO_DELIVERY, Status.STARTED)
-        self.events.append(events.ReadyToDelivery(self.id))
+        self.transit('ready')
 
     def delivery(self):
-        self._transit_status(Status.DELIVERING, Status.READY_TO_DELIVERY)
-        self.events.append(events.Delivering(self.id))
+        self.transit('delivery')
 
     def complete(self):
-        self._transit_status(Status.COMPLETED, Status.DELIVERING)
-        self.events.append(events.CompleteOrder(self.id))
+        self.transit('complete')
 
     def cancel(self):
-        if self.status == Status.COMPLETED:
-            raise
+        self.transit('cancel')
 
-        self.status = Status.CANCELED
-        self.update_time()
-        self.events.append(events.CancelOrder(self.id))
+
+@dataclass(frozen=True)
+class Transition:
+    new: Status
+    allowed_from: tuple[Status, ...]
+    event: type[DomainEvent]
+    requires_items: bool = False
+
+    @property
+    def expected(self) -> str:
+        return ' or '.join(str(x) for x in self.allowed_from)
+
+
+TRANSITIONS = {
+    'begin': Transition(Status.STARTED, (Status.CREATED,), events.StartOrder, requires_items=True),
+    'ready': Transition(Status.READY_TO_DELIVERY, (Status.STARTED,), events.ReadyToDelivery),
+    'delivery': Transition(Status.DELIVERING, (Status.READY_TO_DELIVERY,), events.Delivering),
+    'complete': Transition(Status.COMPLETED, (Status.DELIVERING,), events.CompleteOrder),
+    'cancel': Transition(Status.CANCELED, tuple(x for x in Status if x != Status.COMPLETED), events.CancelOrder),
+}
+
+STATUS_BY_EVENT = {events.CreateNewOrder.__name__: Status.CREATED} | \
+    {x.event.__name__: x.new for x in TRANSITIONS.values()}
@@ -17,6 +17,10 @@ class UpdateOrderAddress(DomainEvent):
     ...
 
 
+class CourierAssigned(DomainEvent):
+    ...
+
+
 class StartOrder(DomainEvent):
     ...
 
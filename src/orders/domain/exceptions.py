@@ -2,9 +2,10 @@ from starlette import status
 from starlette.exceptions import HTTPException
 
 
-class NoItemsInOrderError(Exception):
-    def __repr__(self):
-        return 'Items list for this order is empty'
+class NoItemsInOrderError(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST,
+                         detail='Items list for this order is empty')
 
 
 class InappropriateOrderStatusError(HTTPException):
@@ -24,3 +25,15 @@ class OrderStatusTransitionError(HTTPException):
         msg = f'Unable to change the order status to {new}, the status now is {actual} but expected {expected}'
         super().__init__(status_code=status.HTTP_400_BAD_REQUEST,
                          detail=msg)
+
+
+class OrderVersionConflictError(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=status.HTTP_409_CONFLICT,
+                         detail='The order was changed concurrently, reload it and retry')
+
+
+class UnknownOrderActionError(HTTPException):
+    def __init__(self, action: str):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST,
+                         detail=f'Unknown order action {action}')
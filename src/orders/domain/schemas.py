@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 
 
@@ -11,8 +11,16 @@ class OrderReq(BaseModel):
     customer_name: str
     items: list[OrderItemReq]
     address: str
+    latitude: float | None = Field(None, ge=-90, le=90)
+    longitude: float | None = Field(None, ge=-180, le=180)
 
 
 class OrderUpdate(BaseModel):
     items: list[OrderItemReq] | None
     address: str | None
+
+
+class OrderTransitionReq(BaseModel):
+    order_id: UUID
+    action: str
+    version: int | None = None
@@ -28,3 +28,8 @@ class Status(str, Enum):
 
     def __str__(self):
         return self.value
+
+
+ACTIVE_STATUSES = (Status.CREATED, Status.STARTED, Status.READY_TO_DELIVERY, Status.DELIVERING)
+# a courier is attached once the order is ready and keeps it until the order is closed
+COURIER_STATUSES = (Status.READY_TO_DELIVERY, Status.DELIVERING)
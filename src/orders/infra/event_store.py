@@ -1,11 +1,23 @@
+import json
+
 from fastapi import Depends
+from sqlalchemy import ARRAY, JSON, DateTime, String, Uuid, bindparam, func, insert, literal, select, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql.expression import CTE, Select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models import OrderEvent
+from models import OrderEvent, OutboxMessage
 
 from db_config import get_session
 from shared.domain.events import DomainEvent
 
+from .timeline import append_stmt as append_timeline_stmt, history_entry, timeline_rows, upsert_timeline_stmt
+
+ORDER_EVENTS_CHANNEL = 'order_events'
+
+notify_stmt = text('SELECT pg_notify(:channel, payload) FROM unnest(:payloads) AS payload') \
+    .bindparams(bindparam('payloads', type_=ARRAY(String)))
+
 
 class OrderEventStore:
 
@@ -16,12 +28,64 @@ class OrderEventStore:
         if not events:
             return
 
-        self._db.add_all([self.map_to_model(x) for x in events])
+        await self._db.execute(insert(OrderEvent), [self.map_to_row(x) for x in events])
+        await self._db.execute(upsert_timeline_stmt, timeline_rows(events))
+        await self._db.execute(insert(OutboxMessage), [self.map_to_outbox_row(x) for x in events])
+        await self._notify(events)
         events.clear()
 
+    def append_to(self, source: CTE, event: DomainEvent) -> Select:
+        """Extends a data-modifying CTE returning ``order_id`` so that the event is
+        inserted, projected onto the order timeline, queued in the outbox and
+        published for its row, all within a single statement."""
+        row = self.map_to_row(event)
+        inserted = insert(OrderEvent) \
+            .from_select([OrderEvent.id, OrderEvent.order_id, OrderEvent.name, OrderEvent.data, OrderEvent.created_at],
+                         select(literal(row['id'], Uuid),
+                                source.c.order_id,
+                                literal(row['name']),
+                                literal(row['data'], JSON),
+                                literal(row['created_at'], DateTime(timezone=True)))) \
+            .returning(OrderEvent.order_id) \
+            .cte('inserted_event')
+        queued = insert(OutboxMessage) \
+            .from_select([OutboxMessage.id, OutboxMessage.aggregate_id, OutboxMessage.name, OutboxMessage.payload,
+                          OutboxMessage.created_at],
+                         select(literal(row['id'], Uuid),
+                                source.c.order_id,
+                                literal(row['name']),
+                                literal(row['data'], JSONB),
+                                literal(row['created_at'], DateTime(timezone=True)))) \
+            .cte('queued_event')
+
+        payload = json.dumps(self.map_to_message(event))
+        return select(func.pg_notify(ORDER_EVENTS_CHANNEL, payload)) \
+            .select_from(source.join(inserted, source.c.order_id == inserted.c.order_id)) \
+            .add_cte(append_timeline_stmt(source, event), queued)
+
+    async def _notify(self, events: list[DomainEvent]):
+        payloads = [json.dumps(self.map_to_message(x)) for x in events]
+        await self._db.execute(notify_stmt, {'channel': ORDER_EVENTS_CHANNEL, 'payloads': payloads})
+
     def map_to_model(self, event: DomainEvent):
-        return OrderEvent(id=event.id,
-                          order_id=event.aggregate_id,
-                          name=event.name,
-                          data=event.data,
-                          created_at=event.created_at)
+        return OrderEvent(**self.map_to_row(event))
+
+    @staticmethod
+    def map_to_row(event: DomainEvent) -> dict:
+        return {'id': event.id,
+                'order_id': event.aggregate_id,
+                'name': event.name,
+                'data': event.data,
+                'created_at': event.created_at}
+
+    @staticmethod
+    def map_to_outbox_row(event: DomainEvent) -> dict:
+        return {'id': event.id,
+                'aggregate_id': event.aggregate_id,
+                'name': event.name,
+                'payload': event.data,
+                'created_at': event.created_at}
+
+    @staticmethod
+    def map_to_message(event: DomainEvent) -> dict:
+        return {'order_id': str(event.aggregate_id), **history_entry(event)}
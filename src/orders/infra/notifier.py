@@ -0,0 +1,36 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from db_config import PG_DSN
+from shared.infra.connections import ConnectionManager
+from shared.infra.metrics import WEBSOCKET_PUSH_LAG
+from shared.infra.pubsub import EventHub, PgNotifyListener
+
+from .event_store import ORDER_EVENTS_CHANNEL
+from .outbox import order_outbox
+
+WEBSOCKET_HEARTBEAT_INTERVAL = float(os.getenv('WEBSOCKET_HEARTBEAT_INTERVAL', 10))
+
+order_event_hub = EventHub()
+
+
+def dispatch_order_event(payload: str):
+    message = json.loads(payload)
+    order_event_hub.publish(message.pop('order_id'), message)
+    # every committed event has an outbox row, no need to wait for the next poll
+    order_outbox.wake()
+
+
+order_event_listener = PgNotifyListener(PG_DSN, ORDER_EVENTS_CHANNEL, dispatch_order_event)
+
+
+def observe_push_lag(events: list):
+    now = datetime.now(timezone.utc)
+    for ev in events:
+        WEBSOCKET_PUSH_LAG.observe((now - datetime.fromisoformat(ev['created_at'])).total_seconds())
+
+
+order_connections = ConnectionManager(order_event_hub,
+                                      heartbeat_interval=WEBSOCKET_HEARTBEAT_INTERVAL,
+                                      on_push=observe_push_lag)
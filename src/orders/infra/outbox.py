@@ -0,0 +1,18 @@
+import os
+
+from db_config import engine
+from shared.infra.outbox import OutboxDispatcher, WebhookHandler
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_CONCURRENCY = int(os.getenv('OUTBOX_CONCURRENCY', 10))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+OUTBOX_WEBHOOK_URL = os.getenv('OUTBOX_WEBHOOK_URL')
+
+order_outbox = OutboxDispatcher(engine,
+                                batch_size=OUTBOX_BATCH_SIZE,
+                                concurrency=OUTBOX_CONCURRENCY,
+                                poll_interval=OUTBOX_POLL_INTERVAL,
+                                max_attempts=OUTBOX_MAX_ATTEMPTS)
+if OUTBOX_WEBHOOK_URL:
+    order_outbox.register(WebhookHandler(OUTBOX_WEBHOOK_URL))
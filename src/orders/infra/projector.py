@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from db_config import SessionInst, engine
+from models import DeliveryInfo, Order, OrderEvent
+from orders.domain.entity import OrderEntity
+
+from .repository import OrderDataMapper
+
+logger = logging.getLogger(__name__)
+
+
+class OrderProjector:
+    """Rebuilds the ``orders`` and ``delivery_info`` tables from ``order_events``.
+
+    Orders are processed in keyset batches of ``batch_size`` order ids and the
+    events of a batch are streamed, so memory stays bounded by one batch.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = SessionInst, batch_size: int = 500):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+
+    async def rebuild(self, since: datetime | None = None) -> tuple[int, int]:
+        projected = skipped = 0
+        last_id = None
+        while True:
+            async with self._session_factory() as session:
+                ids = await self._next_ids(session, last_id, since)
+                if not ids:
+                    break
+
+                orders = [x async for x in self._replay(session, ids)]
+                await self._upsert(session, orders)
+                await session.commit()
+
+            projected += len(orders)
+            skipped += len(ids) - len(orders)
+            last_id = ids[-1]
+            logger.info('Projected %d orders, skipped %d', projected, skipped)
+
+        return projected, skipped
+
+    async def _next_ids(self, session: AsyncSession, last_id, since: datetime | None) -> list:
+        stmt = select(OrderEvent.order_id).distinct().order_by(OrderEvent.order_id).limit(self.batch_size)
+        if last_id is not None:
+            stmt = stmt.where(OrderEvent.order_id > last_id)
+        if since is not None:
+            stmt = stmt.where(OrderEvent.created_at >= since)
+
+        return (await session.execute(stmt)).scalars().all()
+
+    async def _replay(self, session: AsyncSession, ids: list):
+        stmt = select(OrderEvent.order_id, OrderEvent.name, OrderEvent.data, OrderEvent.created_at) \
+            .where(OrderEvent.order_id.in_(ids)) \
+            .order_by(OrderEvent.order_id, OrderEvent.created_at, OrderEvent.id) \
+            .execution_options(yield_per=self.batch_size)
+        res = await session.stream(stmt)
+
+        group = []
+        current_id = None
+        async for row in res:
+            if row.order_id != current_id and group:
+                if (order := OrderEntity.replay(current_id, group)) is not None:
+                    yield order
+                group = []
+            current_id = row.order_id
+            group.append((row.name, row.data, row.created_at))
+
+        if group and (order := OrderEntity.replay(current_id, group)) is not None:
+            yield order
+
+    async def _upsert(self, session: AsyncSession, orders: list[OrderEntity]):
+        if not orders:
+            return
+
+        delivery_rows, order_rows = zip(*(OrderDataMapper.entity_to_rows(x) for x in orders))
+
+        stmt = pg_insert(DeliveryInfo)
+        # assignments made before CourierAssigned was recorded are missing from the history, keep them
+        stmt = stmt.on_conflict_do_update(index_elements=[DeliveryInfo.id],
+                                          set_={'address': stmt.excluded.address,
+                                                'courier_id': func.coalesce(stmt.excluded.courier_id,
+                                                                            DeliveryInfo.courier_id)})
+        await session.execute(stmt, list(delivery_rows))
+
+        stmt = pg_insert(Order)
+        stmt = stmt.on_conflict_do_update(index_elements=[Order.id],
+                                          set_={'customer_name': stmt.excluded.customer_name,
+                                                'delivery_info_id': stmt.excluded.delivery_info_id,
+                                                'data': stmt.excluded.data,
+                                                'order_status': stmt.excluded.order_status,
+                                                'created_at': stmt.excluded.created_at,
+                                                'updated_at': stmt.excluded.updated_at})
+        await session.execute(stmt, list(order_rows))
+
+
+async def main(since: datetime | None, batch_size: int):
+    try:
+        projected, skipped = await OrderProjector(batch_size=batch_size).rebuild(since)
+        print(f'Projected {projected} orders, skipped {skipped} without replayable history')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the orders table from order_events')
+    parser.add_argument('--since', type=datetime.fromisoformat, default=None,
+                        help='only orders with events at or after this ISO timestamp')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.since, args.batch_size))
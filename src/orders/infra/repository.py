@@ -1,37 +1,71 @@
+import os
 from datetime import datetime
 
 from fastapi import Depends
-from sqlalchemy import insert, select, update
+from sqlalchemy import DateTime, Integer, String, Uuid, column, insert, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import joinedload
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db_config import get_session
-from models import DeliveryInfo, Order
+from db_config import get_session, last_write_at
+from models import DeliveryInfo, Order, OrderEvent, OrderSnapshot
 
 from shared.infra.repository import GenericRepository
+from shared.infra.singleflight import SingleFlight
 
-from orders.domain.entity import OrderEntity, DeliveryInfoEntity
+from orders.domain.entity import OrderEntity, DeliveryInfoEntity, Transition
+from orders.domain.events import CourierAssigned
 from .event_store import OrderEventStore
 
+from typing import Iterable
 from uuid import UUID
 
-from ..domain.value_obj import OrderItem
+from ..domain.value_obj import OrderItem, Status
+
+ORDER_LOAD_MODE = os.getenv('ORDER_LOAD_MODE', 'row')
+ORDER_SNAPSHOT_EVERY = int(os.getenv('ORDER_SNAPSHOT_EVERY', 20))
+
+order_reads = SingleFlight()
 
 
 class OrderDataMapper:
     @staticmethod
     def model_to_entity(instance: Order):
-        info = instance.delivery_info
         return OrderEntity(id=instance.id,
                            customer_name=instance.customer_name,
-                           delivery_info=DeliveryInfoEntity(id=info.id,
-                                                            address=info.address,
-                                                            courier_id=info.courier_id),
+                           delivery_info=OrderDataMapper.delivery_info_to_entity(instance.delivery_info),
                            order_items=[OrderItem(**x) for x in instance.data['products']],
                            total_price=instance.data.get('total_price', 0.0),
                            status=instance.order_status,
                            created_at=instance.created_at,
-                           updated_at=instance.updated_at)
+                           updated_at=instance.updated_at,
+                           version=instance.version)
+
+    @staticmethod
+    def delivery_info_to_entity(info: DeliveryInfo) -> DeliveryInfoEntity:
+        return DeliveryInfoEntity(id=info.id,
+                                  address=info.address,
+                                  courier_id=info.courier_id,
+                                  latitude=info.latitude,
+                                  longitude=info.longitude)
+
+    @staticmethod
+    def entity_to_rows(entity: OrderEntity) -> tuple[dict, dict]:
+        info = entity.delivery_info
+        delivery_row = {'id': info.id,
+                        'address': info.address,
+                        'courier_id': info.courier_id,
+                        'latitude': info.latitude,
+                        'longitude': info.longitude}
+        order_row = {'id': entity.id,
+                     'customer_name': entity.customer_name,
+                     'delivery_info_id': info.id,
+                     'data': entity.items_as_model_data,
+                     'order_status': entity.status,
+                     'created_at': entity.created_at,
+                     'updated_at': entity.updated_at}
+        return delivery_row, order_row
 
     @staticmethod
     def entity_to_model(entity: OrderEntity):
@@ -40,7 +74,9 @@ class OrderDataMapper:
                      customer_name=entity.customer_name,
                      delivery_info=DeliveryInfo(id=info.id,
                                                 address=info.address,
-                                                courier_id=info.courier_id),
+                                                courier_id=info.courier_id,
+                                                latitude=info.latitude,
+                                                longitude=info.longitude),
                      data=entity.items_as_model_data,
                      order_status=entity.status)
 
@@ -62,13 +98,81 @@ class OrderRepository(GenericRepository):
     async def commit(self):
         await self._db.commit()
 
-    async def get_by_id(self, _id: UUID) -> Order | None:
+    async def get_by_id(self, _id: UUID, coalesce: bool = False) -> Order | None:
+        """``coalesce`` shares one query with concurrent readers of the same order, the
+        instance is then shared too and must stay read-only."""
+        if coalesce:
+            return await order_reads.run(_id, lambda: self.get_by_id(_id), last_write_at(self._db))
+
         order_stmt = select(Order).where(Order.id == _id)
         res = await self._db.execute(order_stmt)
         order = res.scalar_one_or_none()
 
         return order
 
+    async def lock_entities(self, ids: Iterable[UUID]) -> dict[UUID, OrderEntity]:
+        """Loads the orders and locks their rows until commit, in id order so that
+        concurrent batches do not deadlock."""
+        stmt = select(Order) \
+            .options(joinedload(Order.delivery_info, innerjoin=True)) \
+            .where(Order.id.in_(set(ids))) \
+            .order_by(Order.id) \
+            .with_for_update(of=Order)
+        res = await self._db.execute(stmt)
+
+        return {x.id: self.map_model(x) for x in res.scalars()}
+
+    async def get_entity(self, _id: UUID) -> OrderEntity | None:
+        if ORDER_LOAD_MODE == 'events':
+            order = await self.load_from_events(_id)
+            if order is not None:
+                # assignments made before CourierAssigned was recorded only exist in the row
+                info = await self._db.get(DeliveryInfo, order.delivery_info.id)
+                if info is not None:
+                    order.delivery_info = OrderDataMapper.delivery_info_to_entity(info)
+                return order
+
+        order = await self.get_by_id(_id)
+        if order is None:
+            return None
+        return self.map_model(order)
+
+    async def load_from_events(self, _id: UUID) -> OrderEntity | None:
+        snapshot_stmt = select(OrderSnapshot).where(OrderSnapshot.order_id == _id)
+        snapshot = (await self._db.execute(snapshot_stmt)).scalar_one_or_none()
+
+        events_stmt = select(OrderEvent.id, OrderEvent.name, OrderEvent.data, OrderEvent.created_at) \
+            .where(OrderEvent.order_id == _id) \
+            .order_by(OrderEvent.created_at, OrderEvent.id)
+        order, version = None, 0
+        if snapshot is not None:
+            order = OrderEntity.from_snapshot(_id, snapshot.data)
+            version = snapshot.version
+            events_stmt = events_stmt.where(
+                tuple_(OrderEvent.created_at, OrderEvent.id) > (snapshot.last_event_at, snapshot.last_event_id)
+            )
+
+        history = (await self._db.execute(events_stmt)).all()
+        order = OrderEntity.replay(_id, ((x.name, x.data, x.created_at) for x in history), order)
+        if order is not None and len(history) >= ORDER_SNAPSHOT_EVERY:
+            last = history[-1]
+            await self._save_snapshot(order, version + len(history), last.id, last.created_at)
+
+        return order
+
+    async def _save_snapshot(self, entity: OrderEntity, version: int, last_event_id: UUID, last_event_at: datetime):
+        values = {'version': version,
+                  'last_event_id': last_event_id,
+                  'last_event_at': last_event_at,
+                  'data': entity.as_snapshot(),
+                  'created_at': datetime.utcnow()}
+        stmt = pg_insert(OrderSnapshot).values(order_id=entity.id, **values) \
+            .on_conflict_do_update(index_elements=[OrderSnapshot.order_id], set_=values)
+        await self._db.execute(stmt)
+
+    async def save_events(self, entity: OrderEntity):
+        await self.event_store.save(entity.events)
+
     async def add(self, entity: OrderEntity):
         await self._add_delivery_info(entity.delivery_info)
 
@@ -83,6 +187,18 @@ class OrderRepository(GenericRepository):
 
         await self.event_store.save(entity.events)
 
+    async def add_many(self, entities: list[OrderEntity]):
+        if not entities:
+            return
+
+        delivery_rows, order_rows = zip(*(OrderDataMapper.entity_to_rows(x) for x in entities))
+        await self._db.execute(insert(DeliveryInfo), list(delivery_rows))
+        await self._db.execute(insert(Order), list(order_rows))
+
+        await self.event_store.save([ev for x in entities for ev in x.events])
+        for x in entities:
+            x.events.clear()
+
     async def change_order_data(self, entity: OrderEntity):
         stmt = update(Order).where(Order.id == entity.id).values(data=entity.items_as_model_data,
                                                                  updated_at=entity.updated_at)
@@ -96,14 +212,80 @@ class OrderRepository(GenericRepository):
                            courier_id=entity.courier_id)
         await self._db.execute(stmt)
 
+    async def assign_couriers(self, assignments: list[tuple[UUID, DeliveryInfoEntity]]) -> set[UUID]:
+        """Stores the courier of every ``(order id, delivery info)`` pair whose order is still
+        ready to deliver, bumping its version and recording a CourierAssigned event.
+        Returns the ids of the orders that were assigned."""
+        if not assignments:
+            return set()
+
+        # the status condition orders the assignment against concurrent transitions of the same row
+        stmt = update(Order) \
+            .where(Order.id.in_([order_id for order_id, _ in assignments]),
+                   Order.order_status == Status.READY_TO_DELIVERY.value) \
+            .values(version=Order.version + 1) \
+            .returning(Order.id) \
+            .execution_options(synchronize_session=False)
+        assigned = set((await self._db.execute(stmt)).scalars())
+
+        events = []
+        for order_id, info in assignments:
+            if order_id in assigned:
+                await self.change_delivery_info(info)
+                events.append(CourierAssigned(order_id, data={'courier_id': str(info.courier_id)}))
+        await self.event_store.save(events)
+
+        return assigned
+
     async def change_status(self, entity: OrderEntity):
         stmt = update(Order). \
             where(Order.id == entity.id). \
             values(order_status=entity.status,
-                   updated_at=entity.updated_at)
+                   updated_at=entity.updated_at,
+                   version=Order.version + 1)
         await self._db.execute(stmt)
         await self.event_store.save(entity.events)
 
+    async def change_statuses(self, entities: list[OrderEntity]):
+        """Writes status, time and version of many locked orders with one UPDATE, then their events."""
+        if not entities:
+            return
+
+        changes = values(column('order_id', Uuid), column('order_status', String),
+                         column('updated_at', DateTime(timezone=True)), column('version', Integer),
+                         name='changes') \
+            .data([(x.id, str(x.status), x.updated_at, x.version) for x in entities])
+        stmt = update(Order) \
+            .where(Order.id == changes.c.order_id) \
+            .values(order_status=changes.c.order_status,
+                    updated_at=changes.c.updated_at,
+                    version=changes.c.version) \
+            .execution_options(synchronize_session=False)
+        await self._db.execute(stmt)
+
+        await self.event_store.save([ev for x in entities for ev in x.events])
+
+    async def transit_status(self, order_id: UUID, transition: Transition, expected_version: int | None = None) -> int | None:
+        event = transition.event(order_id)
+        conditions = [Order.id == order_id, Order.order_status.in_(transition.allowed_from)]
+        if transition.requires_items:
+            conditions.append(Order.data['total_price'].as_float() >= 1)
+        if expected_version is not None:
+            conditions.append(Order.version == expected_version)
+
+        updated = update(Order) \
+            .where(*conditions) \
+            .values(order_status=transition.new,
+                    updated_at=event.created_at,
+                    version=Order.version + 1) \
+            .returning(Order.id.label('order_id'), Order.version) \
+            .cte('updated_order')
+        stmt = self.event_store.append_to(updated, event).add_columns(updated.c.version)
+
+        res = await self._db.execute(stmt)
+        row = res.one_or_none()
+        return row.version if row is not None else None
+
     async def _add_delivery_info(self, entity: DeliveryInfoEntity):
         stmt = insert(DeliveryInfo).values(**entity.__dict__)
         await self._db.execute(stmt)
@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import ARRAY, DateTime, Uuid, any_, bindparam, func, literal, select, text
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql.expression import CTE
+
+from db_config import SessionInst, engine
+from models import Order, OrderEvent, OrderTimeline
+from orders.domain.entity import STATUS_BY_EVENT
+from orders.domain.value_obj import Status
+from shared.domain.events import DomainEvent
+
+logger = logging.getLogger(__name__)
+
+STATUS_COLUMNS = {x: f'{x.value.lower()}_at' for x in Status}
+
+
+def upsert(stmt):
+    """Merges new events into an existing timeline: the first time a status was
+    reached is kept, the history grows and the last event moves forward."""
+    excluded = stmt.excluded
+    table = OrderTimeline.__table__
+    values = {x: func.coalesce(table.c[x], excluded[x]) for x in STATUS_COLUMNS.values()}
+    values.update(order_status=func.coalesce(excluded.order_status, table.c.order_status),
+                  last_event_id=excluded.last_event_id,
+                  last_event_at=excluded.last_event_at,
+                  history=table.c.history.op('||')(excluded.history))
+    return stmt.on_conflict_do_update(index_elements=[OrderTimeline.order_id], set_=values)
+
+
+upsert_timeline_stmt = upsert(pg_insert(OrderTimeline))
+
+
+def history_entry(event: DomainEvent) -> dict:
+    created_at = event.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+
+    return {'id': str(event.id), 'name': event.name, 'created_at': created_at.isoformat()}
+
+
+def timeline_rows(events: list[DomainEvent]) -> list[dict]:
+    """One row per order, so a batch never touches the same timeline twice in a statement."""
+    rows = {}
+    for event in events:
+        row = rows.get(event.aggregate_id)
+        if row is None:
+            row = rows[event.aggregate_id] = {'order_id': event.aggregate_id, 'order_status': None,
+                                              'history': [], **dict.fromkeys(STATUS_COLUMNS.values())}
+        status = STATUS_BY_EVENT.get(event.name)
+        if status is not None:
+            row['order_status'] = status.value
+            row[STATUS_COLUMNS[status]] = row[STATUS_COLUMNS[status]] or event.created_at
+        row['last_event_id'] = event.id
+        row['last_event_at'] = event.created_at
+        row['history'].append(history_entry(event))
+
+    return list(rows.values())
+
+
+def append_stmt(source: CTE, event: DomainEvent) -> CTE:
+    """Upserts the timeline of every ``order_id`` returned by a data-modifying CTE."""
+    row = timeline_rows([event])[0]
+    columns = [OrderTimeline.order_id, OrderTimeline.order_status, OrderTimeline.last_event_id,
+               OrderTimeline.last_event_at, OrderTimeline.history]
+    values = [source.c.order_id,
+              literal(row['order_status']),
+              literal(row['last_event_id'], Uuid),
+              literal(row['last_event_at'], DateTime(timezone=True)),
+              literal(row['history'], JSONB)]
+    status = STATUS_BY_EVENT.get(event.name)
+    if status is not None:
+        columns.append(getattr(OrderTimeline, STATUS_COLUMNS[status]))
+        values.append(literal(row[STATUS_COLUMNS[status]], DateTime(timezone=True)))
+
+    stmt = pg_insert(OrderTimeline).from_select(columns, select(*values))
+    return upsert(stmt).returning(OrderTimeline.order_id).cte('timeline')
+
+
+class OrderTimelineProjector:
+    """Rebuilds ``order_timelines`` from ``order_events`` in keyset batches of order ids.
+
+    Each batch is a single INSERT ... SELECT aggregating the events in the
+    database; the current status comes from ``orders``.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = SessionInst, batch_size: int = 1000):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+
+    async def rebuild(self, since: datetime | None = None) -> int:
+        projected = 0
+        last_id = None
+        while True:
+            async with self._session_factory() as session:
+                ids = await self._next_ids(session, last_id, since)
+                if not ids:
+                    break
+
+                await self.project(session, ids)
+                await session.commit()
+
+            projected += len(ids)
+            last_id = ids[-1]
+            logger.info('Projected %d order timelines', projected)
+
+        return projected
+
+    async def _next_ids(self, session: AsyncSession, last_id, since: datetime | None) -> list:
+        stmt = select(OrderEvent.order_id).distinct().order_by(OrderEvent.order_id).limit(self.batch_size)
+        if last_id is not None:
+            stmt = stmt.where(OrderEvent.order_id > last_id)
+        if since is not None:
+            stmt = stmt.where(OrderEvent.created_at >= since)
+
+        return (await session.execute(stmt)).scalars().all()
+
+    @staticmethod
+    async def project(session: AsyncSession, ids: list):
+        # history timestamps are rendered by Postgres, keep them in the format the event store writes
+        await session.execute(text("SET LOCAL TimeZone = 'UTC'"))
+
+        order_key = (OrderEvent.created_at, OrderEvent.id)
+        first_at = {column: func.min(OrderEvent.created_at).filter(OrderEvent.name.in_(
+                        [name for name, x in STATUS_BY_EVENT.items() if x == status]))
+                    for status, column in STATUS_COLUMNS.items()}
+        entry = func.jsonb_build_object('id', OrderEvent.id, 'name', OrderEvent.name,
+                                        'created_at', OrderEvent.created_at)
+        aggregated = select(OrderEvent.order_id,
+                            func.max(Order.order_status),
+                            *first_at.values(),
+                            (func.array_agg(aggregate_order_by(OrderEvent.id, *(x.desc() for x in order_key))))[1],
+                            func.max(OrderEvent.created_at),
+                            func.jsonb_agg(aggregate_order_by(entry, *order_key))) \
+            .join(Order, Order.id == OrderEvent.order_id) \
+            .where(OrderEvent.order_id == any_(bindparam('ids', ids, type_=ARRAY(Uuid)))) \
+            .group_by(OrderEvent.order_id)
+
+        columns = ['order_id', 'order_status', *first_at, 'last_event_id', 'last_event_at', 'history']
+        stmt = pg_insert(OrderTimeline).from_select(columns, aggregated)
+        stmt = stmt.on_conflict_do_update(index_elements=[OrderTimeline.order_id],
+                                          set_={x: stmt.excluded[x] for x in columns[1:]})
+        await session.execute(stmt)
+
+
+async def main(since: datetime | None, batch_size: int):
+    try:
+        projected = await OrderTimelineProjector(batch_size=batch_size).rebuild(since)
+        print(f'Projected {projected} order timelines')
+    finally:
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild order_timelines from order_events')
+    parser.add_argument('--since', type=datetime.fromisoformat, default=None,
+                        help='only orders with events at or after this ISO timestamp')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.since, args.batch_size))
@@ -1,18 +1,47 @@
 from typing import Sequence
+from uuid import UUID
 
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db_config import get_read_session
 
 from products.domain.entity import ProductEntity
+from products.infra.notifier import catalog_version
 from products.infra.repository import ProductRepository
+from products.infra.snapshot import current_snapshot
 
 
 class ProductQuery:
 
-    def __init__(self, repo: ProductRepository = Depends()):
-        self.repo = repo
+    def __init__(self, db: AsyncSession = Depends(get_read_session)):
+        self.repo = ProductRepository(db)
 
-    async def get_product(self, product_id: int) -> ProductEntity:
+    async def get_product(self, product_id: UUID) -> ProductEntity:
         return await self.repo.get_by_id(product_id)
 
     async def get_category_products(self, category_name: str) -> Sequence[ProductEntity]:
         return await self.repo.get_products_by_category_name(category_name)
+
+    async def get_versioned_product(self, product_id: UUID) -> tuple[int | None, ProductEntity | None]:
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return snapshot.version, snapshot.get_product(product_id)
+
+        version = await self._read_version()
+        return version, await self.repo.get_by_id(product_id, cached=False)
+
+    async def get_versioned_category_products(self, category_name: str) -> tuple[int | None, Sequence[ProductEntity]]:
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return snapshot.version, snapshot.get_category(category_name) or []
+
+        version = await self._read_version()
+        return version, await self.repo.get_products_by_category_name(category_name, cached=False)
+
+    async def _read_version(self) -> int | None:
+        # read before the data and bypassing the entity cache: the data is then at least as new as
+        # its version, so a racing write costs a client one spare 200 instead of a wrong 304
+        version = await self.repo.get_catalog_version()
+        catalog_version.observe(version)
+        return version
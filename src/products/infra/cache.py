@@ -0,0 +1,73 @@
+import os
+from typing import Hashable, Iterable, Sequence
+from uuid import UUID
+
+from products.domain.entity import ProductEntity
+from shared.infra.cache import TTLCache
+
+CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', 4096))
+CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', 300))
+
+
+class CatalogCache:
+
+    def __init__(self, maxsize: int = CATALOG_CACHE_SIZE, ttl: float = CATALOG_CACHE_TTL):
+        self.by_id = TTLCache(maxsize, ttl)
+        self.by_category = TTLCache(maxsize, ttl)
+        # serialized responses tagged with the catalog version they were read at
+        self.bodies = TTLCache(maxsize, ttl)
+
+    def get_product(self, _id: UUID) -> ProductEntity | None:
+        return self.by_id.get(_id)
+
+    def get_products(self, _ids: Iterable[UUID]) -> tuple[list[ProductEntity], list[UUID]]:
+        found, missing = [], []
+        for _id in _ids:
+            product = self.by_id.get(_id)
+            if product is None:
+                missing.append(_id)
+            else:
+                found.append(product)
+        return found, missing
+
+    def put_products(self, products: Iterable[ProductEntity]):
+        for p in products:
+            self.by_id.set(p.id, p)
+
+    def get_category(self, category_name: str) -> Sequence[ProductEntity] | None:
+        products = self.by_category.get(category_name)
+        if products is None:
+            return None
+        return list(products)
+
+    def put_category(self, category_name: str, products: Sequence[ProductEntity]):
+        self.by_category.set(category_name, tuple(products))
+
+    def get_body(self, key: Hashable) -> tuple[int, bytes] | None:
+        return self.bodies.get(key)
+
+    def put_body(self, key: Hashable, version: int, body: bytes):
+        self.bodies.set(key, (version, body))
+
+    def invalidate_product(self, _id: UUID):
+        self.by_id.invalidate(_id)
+        self.by_category.clear()
+        self.bodies.clear()
+
+    def invalidate_category(self, category_name: str):
+        self.by_category.invalidate(category_name)
+        self.bodies.invalidate(('category', category_name))
+
+    def clear(self):
+        self.by_id.clear()
+        self.by_category.clear()
+        self.bodies.clear()
+
+    @property
+    def stats(self) -> dict:
+        return {'by_id': self.by_id.stats,
+                'by_category': self.by_category.stats,
+                'bodies': self.bodies.stats}
+
+
+catalog_cache = CatalogCache()
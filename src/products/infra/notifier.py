@@ -0,0 +1,62 @@
+import logging
+from typing import Callable
+
+import asyncpg
+
+from db_config import PG_DSN
+from shared.infra.pubsub import PgNotifyListener
+
+from .cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CHANNEL = 'catalog_changed'
+
+
+class CatalogVersion:
+    """The newest ``catalog_meta.version`` this process has seen.
+
+    Triggers bump the version and NOTIFY it on every product or category
+    write. Moving forward drops everything cached from older catalog data.
+    ``current`` is None until the first version is known, nothing can be
+    validated against it until then.
+    """
+
+    def __init__(self):
+        self.current: int | None = None
+        self.changes = 0
+        self._subscribers: list[Callable[[int], None]] = []
+
+    @property
+    def stats(self) -> dict:
+        return {'version': self.current or 0,
+                'changes': self.changes}
+
+    def subscribe(self, callback: Callable[[int], None]):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[int], None]):
+        self._subscribers.remove(callback)
+
+    def observe(self, version: int | None):
+        if version is None or (self.current is not None and version <= self.current):
+            return
+
+        if self.current is not None:
+            self.changes += 1
+            logger.info('Catalog changed to version %d', version)
+        self.current = version
+        catalog_cache.clear()
+        for callback in tuple(self._subscribers):
+            callback(version)
+
+    def apply(self, payload: str):
+        self.observe(int(payload))
+
+    async def load(self, conn: asyncpg.Connection):
+        # notifications sent while LISTEN was down are lost, read the version directly instead
+        self.observe(await conn.fetchval('SELECT version FROM catalog_meta WHERE id = 1'))
+
+
+catalog_version = CatalogVersion()
+catalog_listener = PgNotifyListener(PG_DSN, CATALOG_CHANNEL, catalog_version.apply, on_connect=catalog_version.load)
@@ -1,4 +1,5 @@
 from typing import Mapping, Sequence
+from uuid import UUID
 
 from fastapi import Depends
 
@@ -11,7 +12,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from db_config import get_session
 
-from models import Category, Product
+from models import CatalogMeta, Category, Product
+
+from .cache import catalog_cache
+from .snapshot import current_snapshot
 
 
 class ProductDataMapper:
@@ -28,11 +32,24 @@ class ProductRepository(GenericRepository):
 
     def __init__(self, db: AsyncSession = Depends(get_session)):
         self._db = db
+        self._cache = catalog_cache
 
     async def commit(self):
         await self._db.commit()
 
-    async def get_by_id(self, _id: int) -> ProductEntity | None:
+    async def get_catalog_version(self) -> int | None:
+        res = await self._db.execute(select(CatalogMeta.version).where(CatalogMeta.id == 1))
+        return res.scalar()
+
+    async def get_by_id(self, _id: UUID, cached: bool = True) -> ProductEntity | None:
+        snapshot = current_snapshot() if cached else None
+        if snapshot is not None:
+            return snapshot.get_product(_id)
+
+        product = self._cache.get_product(_id) if cached else None
+        if product is not None:
+            return product
+
         stmt = select(Product.id, Product.product_name, Product.price, Category.category_name) \
             .join(Category).where(Product.id == _id)
         res = await self._db.execute(stmt)
@@ -40,23 +57,46 @@ class ProductRepository(GenericRepository):
 
         if res is None:
             return res
-        return self.map_model_to_entity(res)
 
-    async def get_many_by_ids(self, _ids: Sequence[int]) -> Sequence:
+        product = self.map_model_to_entity(res)
+        self._cache.put_products([product])
+        return product
+
+    async def get_many_by_ids(self, _ids: Sequence[UUID]) -> Sequence:
+        snapshot = current_snapshot()
+        if snapshot is not None:
+            return [x for x in map(snapshot.get_product, _ids) if x is not None]
+
+        products, missing = self._cache.get_products(_ids)
+        if not missing:
+            return products
+
         stmt = select(Product.id, Product.product_name, Product.price, Category.category_name) \
-            .join(Category).where(Product.id.in_(_ids))
+            .join(Category).where(Product.id.in_(missing))
         res = await self._db.execute(stmt)
         res = res.mappings().all()
 
-        return self.map_model_to_entity(res)
+        loaded = self.map_model_to_entity(res)
+        self._cache.put_products(loaded)
+        return products + loaded
+
+    async def get_products_by_category_name(self, category_name: str, cached: bool = True) -> Sequence:
+        snapshot = current_snapshot() if cached else None
+        if snapshot is not None:
+            return snapshot.get_category(category_name) or []
+
+        products = self._cache.get_category(category_name) if cached else None
+        if products is not None:
+            return products
 
-    async def get_products_by_category_name(self, category_name: str) -> Sequence:
         category_id_stms = select(Category.id).where(Category.category_name == category_name).scalar_subquery()
         stmt = select(Product.id, Product.product_name, Product.price).where(Product.category_id == category_id_stms)
         res = await self._db.execute(stmt)
         res = res.mappings().all()
 
-        return self.map_model_to_entity(res)
+        products = self.map_model_to_entity(res)
+        self._cache.put_category(category_name, products)
+        return products
 
     def map_model_to_entity(self, instance: Mapping | Sequence) -> ProductEntity | Sequence:
         if isinstance(instance, Sequence):
@@ -0,0 +1,335 @@
+"""Catalog snapshot shared by every worker process through a memory-mapped file.
+
+The file holds fixed-size product records sorted by id, categories sorted by
+name with their members, and a string pool, so lookups are binary searches
+over the mapping and nothing is copied into the Python heap per worker. The
+pages live once in the OS page cache however many workers map them; put the
+file on tmpfs (``/dev/shm``) to keep it off the disk entirely.
+
+Refresh protocol: when ``catalog_meta.version`` moves past the mapped file,
+each worker takes an exclusive ``flock`` on ``<path>.lock``. The first one
+rebuilds the file from a single REPEATABLE READ snapshot, writes it next to
+the target and ``os.replace``s it in, the others find the new version under
+the lock and just remap. Readers never see a partial file, and a stale
+mapping is never consulted because ``current`` compares it with the version
+the catalog listener reports.
+"""
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from math import isnan, nan
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from db_config import SessionInst
+from models import CatalogMeta, Category, Product
+from products.domain.entity import ProductEntity
+
+from .notifier import catalog_version
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SNAPSHOT_PATH = os.getenv('CATALOG_SNAPSHOT_PATH')
+
+MAGIC = b'CATS'
+FORMAT = 1
+NONE = 0xFFFFFFFF
+
+# magic, format, catalog version, products, categories, category members
+HEADER = struct.Struct('<4sH2xQIII')
+# id, price (NaN for NULL), category index, name offset, name length
+PRODUCT = struct.Struct('<16sdIII')
+# name offset, name length, first member, member count
+CATEGORY = struct.Struct('<IIII')
+MEMBER = struct.Struct('<I')
+
+
+def encode(version: int, products: Iterable, categories: Iterable[str]) -> bytes:
+    """Serializes ``(id, product_name, price, category_name)`` rows and all category names.
+
+    Products without a category are left out, like the inner join of the
+    repository queries leaves them out of the catalog.
+    """
+    products = sorted((x for x in products if x[3] is not None), key=lambda x: x[0].bytes)
+    names = sorted({x.encode() for x in categories if x is not None}
+                   | {x[3].encode() for x in products if x[3] is not None})
+    category_index = {x: i for i, x in enumerate(names)}
+
+    strings = bytearray()
+
+    def add_string(value: str | bytes | None) -> tuple[int, int]:
+        if value is None:
+            return NONE, NONE
+        data = value.encode() if isinstance(value, str) else value
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    members = [[] for _ in names]
+    product_records = bytearray()
+    for i, (_id, product_name, price, category_name) in enumerate(products):
+        category = NONE if category_name is None else category_index[category_name.encode()]
+        if category != NONE:
+            members[category].append(i)
+        product_records += PRODUCT.pack(_id.bytes, nan if price is None else price, category, *add_string(product_name))
+
+    category_records = bytearray()
+    member_records = bytearray()
+    first = 0
+    for name, indexes in zip(names, members):
+        category_records += CATEGORY.pack(*add_string(name), first, len(indexes))
+        for x in indexes:
+            member_records += MEMBER.pack(x)
+        first += len(indexes)
+
+    header = HEADER.pack(MAGIC, FORMAT, version, len(products), len(names), first)
+    return b''.join((header, product_records, category_records, member_records, strings))
+
+
+class SnapshotReader:
+    """Binary searches over one mapped snapshot file, the mapping is never modified."""
+
+    def __init__(self, fileno: int):
+        self._mm = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        magic, fmt, self.version, self.products, self.categories, members = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or fmt != FORMAT:
+            self._mm.close()
+            raise ValueError(f'Not a catalog snapshot of format {FORMAT}')
+
+        self._categories_at = HEADER.size + self.products * PRODUCT.size
+        self._members_at = self._categories_at + self.categories * CATEGORY.size
+        self._strings_at = self._members_at + members * MEMBER.size
+
+    @property
+    def size(self) -> int:
+        return len(self._mm)
+
+    def close(self):
+        self._mm.close()
+
+    def get_product(self, _id: UUID) -> ProductEntity | None:
+        key = _id.bytes
+        lo, hi = 0, self.products
+        while lo < hi:
+            mid = (lo + hi) // 2
+            at = HEADER.size + mid * PRODUCT.size
+            probe = self._mm[at:at + 16]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return self._product(mid)
+        return None
+
+    def get_category(self, category_name: str) -> list[ProductEntity] | None:
+        key = category_name.encode()
+        lo, hi = 0, self.categories
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset, length, first, count = CATEGORY.unpack_from(self._mm, self._categories_at + mid * CATEGORY.size)
+            probe = self._string(offset, length)
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return [self._product(MEMBER.unpack_from(self._mm, self._members_at + i * MEMBER.size)[0])
+                        for i in range(first, first + count)]
+        return None
+
+    def _product(self, index: int) -> ProductEntity:
+        _id, price, category, offset, length = PRODUCT.unpack_from(self._mm, HEADER.size + index * PRODUCT.size)
+        category_name = None
+        if category != NONE:
+            name_at = CATEGORY.unpack_from(self._mm, self._categories_at + category * CATEGORY.size)
+            category_name = self._string(name_at[0], name_at[1]).decode()
+
+        product_name = self._string(offset, length)
+        return ProductEntity(id=UUID(bytes=_id),
+                             product_name=None if product_name is None else product_name.decode(),
+                             price=None if isnan(price) else price,
+                             category_name=category_name)
+
+    def _string(self, offset: int, length: int) -> bytes | None:
+        if offset == NONE:
+            return None
+        return self._mm[self._strings_at + offset:self._strings_at + offset + length]
+
+
+class CatalogSnapshot:
+
+    def __init__(self, path: str, session_factory: async_sessionmaker = SessionInst):
+        self.path = path
+        self._session_factory = session_factory
+        self._reader: SnapshotReader | None = None
+        self._file_id: tuple[int, int] | None = None
+        self._refreshing = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.builds = 0
+        self.remaps = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int | None:
+        return None if self._reader is None else self._reader.version
+
+    @property
+    def current(self) -> SnapshotReader | None:
+        """The mapped snapshot if it is at the latest known catalog version, None otherwise."""
+        reader = self._reader
+        if reader is None or catalog_version.current is None or reader.version < catalog_version.current:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return reader
+
+    @property
+    def stats(self) -> dict:
+        reader = self._reader
+        return {'version': 0 if reader is None else reader.version,
+                'products': 0 if reader is None else reader.products,
+                'size_bytes': 0 if reader is None else reader.size,
+                'builds': self.builds,
+                'remaps': self.remaps,
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def start(self):
+        if self._task is None:
+            catalog_version.subscribe(self._on_version)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            catalog_version.unsubscribe(self._on_version)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+            self._file_id = None
+
+    def _on_version(self, version: int):
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Catalog snapshot refresh failed')
+                await asyncio.sleep(1)
+                continue
+
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+    async def refresh(self):
+        async with self._refreshing:
+            if self._remap() and self._is_current():
+                return
+
+            lock = await asyncio.to_thread(self._lock)
+            try:
+                # another worker may have rebuilt the file while this one waited for the lock
+                if self._remap() and self._is_current():
+                    return
+
+                version, products, categories = await self._load()
+                data = encode(version, products, categories)
+                await asyncio.to_thread(self._write, data)
+                self.builds += 1
+                logger.info('Catalog snapshot %d written: %d products, %d bytes', version, len(products), len(data))
+                self._remap()
+            finally:
+                lock.close()
+
+    def _is_current(self) -> bool:
+        return catalog_version.current is None or self.version >= catalog_version.current
+
+    async def _load(self) -> tuple[int, list, list[str]]:
+        async with self._session_factory() as session:
+            # the version and the rows must come from one snapshot of the database
+            await session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+            version = (await session.execute(select(CatalogMeta.version).where(CatalogMeta.id == 1))).scalar_one()
+            stmt = select(Product.id, Product.product_name, Product.price, Category.category_name) \
+                .join(Category, Category.id == Product.category_id)
+            products = (await session.execute(stmt)).all()
+            categories = (await session.execute(select(Category.category_name))).scalars().all()
+
+        return version, products, categories
+
+    def _lock(self):
+        lock = open(f'{self.path}.lock', 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        except BaseException:
+            lock.close()
+            raise
+        return lock
+
+    def _write(self, data: bytes):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # mkstemp creates 0600, workers running as another user still need to map it
+                os.fchmod(f.fileno(), 0o644)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _remap(self) -> bool:
+        """Maps the file if it was replaced since the last look, False when there is no usable file."""
+        try:
+            with open(self.path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                file_id = (stat.st_dev, stat.st_ino)
+                if file_id == self._file_id:
+                    return True
+                reader = SnapshotReader(f.fileno())
+        except FileNotFoundError:
+            return False
+        except (ValueError, struct.error):
+            logger.warning('Ignoring unreadable catalog snapshot %s', self.path)
+            return False
+
+        if self._reader is not None and reader.version < self._reader.version:
+            reader.close()
+            return True
+
+        previous, self._reader, self._file_id = self._reader, reader, file_id
+        # lookups never hold on to the mapping across an await, closing the old one right away is safe
+        if previous is not None:
+            previous.close()
+        self.remaps += 1
+        return True
+
+
+catalog_snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_PATH) if CATALOG_SNAPSHOT_PATH else None
+
+
+def current_snapshot() -> SnapshotReader | None:
+    return None if catalog_snapshot is None else catalog_snapshot.current
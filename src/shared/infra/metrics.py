@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from functools import lru_cache
+from typing import Callable, Iterable
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# set by gunicorn.conf.py: every worker writes its metrics to files there and a scrape sums them up
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+METRICS_PUBLISH_INTERVAL = float(os.getenv('METRICS_PUBLISH_INTERVAL', 5))
+
+HTTP_REQUEST_DURATION = Histogram('http_request_duration_seconds',
+                                  'HTTP request latency by route template',
+                                  ['method', 'route', 'status'])
+HTTP_REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight',
+                                'HTTP requests currently being processed',
+                                ['method', 'route'],
+                                multiprocess_mode='livesum')
+
+DB_STATEMENT_DURATION = Histogram('db_statement_duration_seconds',
+                                  'Database statement latency by query shape',
+                                  ['shape'],
+                                  buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+DB_STATEMENT_ERRORS = Counter('db_statement_errors_total',
+                              'Database statements that raised an error',
+                              ['shape'])
+DB_READ_ROUTING = Counter('db_read_routing_total',
+                          'Read sessions opened per target database',
+                          ['target'])
+
+WEBSOCKET_CONNECTIONS = Gauge('websocket_connections',
+                              'Open order tracking WebSocket connections',
+                              multiprocess_mode='livesum')
+WEBSOCKET_PUSH_LAG = Histogram('websocket_push_lag_seconds',
+                               'Delay between an order event and its delivery to a socket',
+                               buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+
+ORDER_STATUS_TRANSITIONS = Counter('order_status_transitions_total',
+                                   'Committed order status transitions',
+                                   ['status'])
+
+OUTBOX_DELIVERIES = Counter('outbox_deliveries_total',
+                            'Outbox messages handed to handlers by event name and result',
+                            ['name', 'result'])
+OUTBOX_DELIVERY_LAG = Histogram('outbox_delivery_lag_seconds',
+                                'Delay between an event and its successful delivery from the outbox',
+                                buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300))
+
+_target_re = re.compile(r'\b(?:(INSERT)\s+INTO|(UPDATE)|(DELETE)\s+FROM)\s+"?([\w.]+)', re.IGNORECASE)
+_from_re = re.compile(r'\bFROM\s+"?([\w.]+)', re.IGNORECASE)
+_verb_re = re.compile(r'^\s*(\w+)')
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    verb = _verb_re.match(statement)
+    if verb is None:
+        return 'UNKNOWN'
+
+    verb = verb.group(1).upper()
+    if verb in ('INSERT', 'UPDATE', 'DELETE', 'WITH'):
+        if target := _target_re.search(statement):
+            return f'{verb} {target.group(4)}'
+    if verb in ('SELECT', 'WITH'):
+        if source := _from_re.search(statement):
+            return f'{verb} {source.group(1)}'
+    return verb
+
+
+def instrument_engine(engine: AsyncEngine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started_at = conn.info['query_start'].pop()
+        DB_STATEMENT_DURATION.labels(statement_shape(statement)).observe(time.perf_counter() - started_at)
+
+    @event.listens_for(sync_engine, 'handle_error')
+    def handle_error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
+        DB_STATEMENT_ERRORS.labels(statement_shape(context.statement or '')).inc()
+
+
+class PoolCollector(Collector):
+
+    def __init__(self, engines: dict[str, AsyncEngine]):
+        self._engines = engines
+
+    def collect(self) -> Iterable:
+        metrics = {
+            'db_pool_size': ('Configured pool size', lambda pool: pool.size()),
+            'db_pool_checked_out': ('Connections currently checked out', lambda pool: pool.checkedout()),
+            'db_pool_checked_in': ('Idle connections in the pool', lambda pool: pool.checkedin()),
+            'db_pool_overflow': ('Connections opened above the pool size', lambda pool: max(pool.overflow(), 0)),
+        }
+        for name, (documentation, value) in metrics.items():
+            family = GaugeMetricFamily(name, documentation, labels=['engine'])
+            for engine_name, engine in self._engines.items():
+                family.add_metric([engine_name], value(engine.pool))
+            yield family
+
+
+class StatsCollector(Collector):
+
+    def __init__(self, name: str, documentation: str, source: Callable[[], dict], counters: Iterable[str] = ()):
+        self._name = name
+        self._documentation = documentation
+        self._source = source
+        self._counters = set(counters)
+
+    def collect(self) -> Iterable:
+        for key, value in self._source().items():
+            name = f'{self._name}_{key}'
+            if key in self._counters:
+                yield CounterMetricFamily(name, self._documentation, value=value)
+            else:
+                yield GaugeMetricFamily(name, self._documentation, value=value)
+
+
+class MultiProcessPublisher:
+    """Copies custom collectors of this worker into multiprocess metric files.
+
+    Collectors read in-process state, which a scrape served by another
+    worker cannot see. Every ``interval`` their counters are added to
+    multiprocess counters, summed over all workers, and their gauges are
+    written per worker (a ``pid`` label) until the worker exits.
+    """
+
+    def __init__(self, interval: float = METRICS_PUBLISH_INTERVAL):
+        self.interval = interval
+        self._collectors: list[Collector] = []
+        self._metrics: dict[str, Counter | Gauge] = {}
+        self._published: dict[tuple, float] = {}
+        self._task: asyncio.Task | None = None
+
+    def register(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                self.publish()
+            except Exception:
+                logger.exception('Unable to publish worker metrics')
+            await asyncio.sleep(self.interval)
+
+    def publish(self):
+        for collector in self._collectors:
+            for family in collector.collect():
+                for sample in family.samples:
+                    if family.type == 'counter' and sample.name == f'{family.name}_total':
+                        self._add(family, sample)
+                    elif family.type == 'gauge':
+                        self._metric(family, sample, Gauge).set(sample.value)
+
+    def _add(self, family, sample):
+        key = (family.name, tuple(sorted(sample.labels.items())))
+        delta = sample.value - self._published.get(key, 0)
+        self._published[key] = sample.value
+        # a source that went backwards was reset, its new value is counted again from zero
+        if delta < 0:
+            delta = sample.value
+        if delta:
+            self._metric(family, sample, Counter).inc(delta)
+
+    def _metric(self, family, sample, kind):
+        metric = self._metrics.get(family.name)
+        if metric is None:
+            options = {'multiprocess_mode': 'liveall'} if kind is Gauge else {}
+            metric = self._metrics[family.name] = kind(family.name, family.documentation, list(sample.labels),
+                                                       registry=None, **options)
+        return metric.labels(**sample.labels) if sample.labels else metric
+
+
+multiprocess_publisher = MultiProcessPublisher() if PROMETHEUS_MULTIPROC_DIR else None
+
+
+def register_collector(collector: Collector):
+    if multiprocess_publisher is not None:
+        multiprocess_publisher.register(collector)
+    else:
+        REGISTRY.register(collector)
+
+
+def register_stats(name: str, documentation: str, source: Callable[[], dict], counters: Iterable[str] = ()):
+    register_collector(StatsCollector(name, documentation, source, counters))
+
+
+def metrics_registry() -> CollectorRegistry:
+    """The registry to expose: this process, or every worker when running under gunicorn."""
+    if multiprocess_publisher is None:
+        return REGISTRY
+
+    multiprocess_publisher.publish()
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
@@ -0,0 +1,272 @@
+"""Transactional outbox delivery.
+
+Writers insert ``outbox`` rows in the same transaction as the change they
+describe. ``OutboxDispatcher`` claims whole aggregates: it takes a session
+level advisory lock per aggregate whose oldest message is due, so app
+instances share the backlog without two of them delivering messages of one
+aggregate at once. The locks are held by the dispatcher's connection, not by
+a transaction, so no transaction stays open while handlers run, and a
+crashed instance releases its aggregates with its connection.
+
+Messages of an aggregate go out in order and an aggregate stops at its first
+failure: the failed message is retried with exponential backoff and parked
+(``available_at`` set to NULL) after ``max_attempts``, the messages after it
+are pushed back to the same ``available_at``. Messages queued later wait
+behind it too, only an aggregate's oldest message can start a delivery.
+Delivery is at least once, handlers must be idempotent.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import String, bindparam, cast, delete, exists, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import aliased
+
+from models import OutboxMessage
+from shared.infra.metrics import OUTBOX_DELIVERIES, OUTBOX_DELIVERY_LAG
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+OUTBOX_LOCK_CLASS = 0x6F757462  # first key of the two-key advisory locks, the aggregate hash is the second
+
+outbox = OutboxMessage.__table__
+# core statement: executemany with a custom WHERE is not an ORM bulk update by primary key
+reschedule_stmt = update(outbox) \
+    .where(outbox.c.message_id == bindparam('b_message_id')) \
+    .values(attempts=outbox.c.attempts + 1,
+            available_at=bindparam('retry_at'),
+            last_error=bindparam('error'))
+defer_stmt = update(outbox) \
+    .where(outbox.c.message_id == bindparam('b_message_id')) \
+    .values(available_at=bindparam('retry_at'))
+
+earlier = aliased(OutboxMessage)
+# oldest message of its aggregate still in the outbox, and due
+heads = select(OutboxMessage.aggregate_id) \
+    .where(OutboxMessage.available_at <= func.now(),
+           ~exists().where(earlier.aggregate_id == OutboxMessage.aggregate_id,
+                           tuple_(earlier.created_at, earlier.id) < tuple_(OutboxMessage.created_at, OutboxMessage.id))) \
+    .order_by(OutboxMessage.available_at, OutboxMessage.created_at) \
+    .limit(bindparam('batch_size')) \
+    .cte('heads') \
+    .prefix_with('MATERIALIZED')
+# materialized: the lock must only be tried on the heads, not on rows the planner looks at before the LIMIT
+lock_heads_stmt = select(heads.c.aggregate_id) \
+    .where(func.pg_try_advisory_lock(OUTBOX_LOCK_CLASS, func.hashtext(cast(heads.c.aggregate_id, String))))
+unlock_stmt = select(func.pg_advisory_unlock_all())
+
+
+class WebhookHandler:
+    """Posts every message as JSON to ``url``, any non-2xx answer is a failure."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        # only needed when a webhook is configured, and costs tens of milliseconds to import
+        import httpx
+
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def __call__(self, message: dict):
+        response = await self._client.post(self.url, json=message)
+        response.raise_for_status()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class OutboxDispatcher:
+
+    def __init__(self,
+                 engine: AsyncEngine,
+                 batch_size: int = 100,
+                 concurrency: int = 10,
+                 poll_interval: float = 1.0,
+                 handler_timeout: float = 10.0,
+                 max_attempts: int = 10,
+                 backoff: float = 1.0,
+                 max_backoff: float = 300.0):
+        self._engine = engine
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.handler_timeout = handler_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._handlers: dict[str | None, list[Handler]] = defaultdict(list)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.batches = 0
+        self.delivered = 0
+        self.failed = 0
+        self.parked = 0
+        self.lag_seconds = 0.0
+
+    @property
+    def stats(self) -> dict:
+        return {'batches': self.batches,
+                'delivered': self.delivered,
+                'failed': self.failed,
+                'parked': self.parked,
+                'lag_seconds': self.lag_seconds}
+
+    def register(self, handler: Handler, *names: str):
+        """Subscribes ``handler`` to the given event names, or to every event without names."""
+        for name in names or (None,):
+            self._handlers[name].append(handler)
+
+    def wake(self):
+        """Checks the outbox right away instead of at the next poll."""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for handler in {x for handlers in self._handlers.values() for x in handlers}:
+            if hasattr(handler, 'aclose'):
+                await handler.aclose()
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Outbox dispatch failed')
+                claimed = 0
+
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        async with self._engine.connect() as conn:
+            try:
+                async with AsyncSession(bind=conn) as session:
+                    rows = await self._claim(session)
+                    # the aggregate locks outlive the claiming transaction
+                    await session.commit()
+                    if not rows:
+                        self.lag_seconds = 0.0
+                        return 0
+
+                    self.batches += 1
+                    self.lag_seconds = max((datetime.now(timezone.utc) - rows[0].created_at).total_seconds(), 0)
+
+                    # events of one aggregate go out in order, aggregates go out concurrently
+                    groups = defaultdict(list)
+                    for row in rows:
+                        groups[row.aggregate_id].append(row)
+                    results = await asyncio.gather(*(self._deliver_group(x) for x in groups.values()))
+                    await self._settle(session, [x for group in results for x in group])
+                    await session.commit()
+            finally:
+                # session level locks survive the rollback the pool does on release
+                await conn.rollback()
+                await conn.execute(unlock_stmt)
+                await conn.commit()
+
+        return len(rows)
+
+    async def _claim(self, session: AsyncSession) -> list:
+        """Locks up to ``batch_size`` aggregates and returns their due messages in order."""
+        locked = (await session.execute(lock_heads_stmt, {'batch_size': self.batch_size})).scalars().all()
+        if not locked:
+            return []
+
+        # read after locking: another instance may have delivered or deferred messages meanwhile
+        stmt = select(OutboxMessage.id, OutboxMessage.aggregate_id, OutboxMessage.name, OutboxMessage.payload,
+                      OutboxMessage.created_at, OutboxMessage.attempts,
+                      func.coalesce(OutboxMessage.available_at <= func.now(), False).label('due')) \
+            .where(OutboxMessage.aggregate_id.in_(locked)) \
+            .order_by(OutboxMessage.created_at, OutboxMessage.id) \
+            .limit(self.batch_size)
+        rows, blocked = [], set()
+        for row in (await session.execute(stmt)).all():
+            # a message that is not due holds back the messages after it
+            if not row.due:
+                blocked.add(row.aggregate_id)
+            elif row.aggregate_id not in blocked:
+                rows.append(row)
+        return rows
+
+    async def _deliver_group(self, rows: list) -> list[tuple]:
+        """Delivers one aggregate's messages until the first failure, the rest are not attempted (``False``)."""
+        async with self._semaphore:
+            results = []
+            for row in rows:
+                error = await self._deliver(row)
+                results.append((row, error))
+                if error is not None:
+                    results.extend((x, False) for x in rows[len(results):])
+                    break
+            return results
+
+    async def _deliver(self, row) -> str | None:
+        message = {'id': str(row.id),
+                   'aggregate_id': str(row.aggregate_id),
+                   'name': row.name,
+                   'data': row.payload,
+                   'created_at': row.created_at.isoformat()}
+        try:
+            for handler in self._handlers.get(row.name, []) + self._handlers.get(None, []):
+                await asyncio.wait_for(handler(message), self.handler_timeout)
+        except Exception as e:
+            logger.warning('Outbox message %s (%s) failed: %r', row.id, row.name, e)
+            OUTBOX_DELIVERIES.labels(row.name, 'failed').inc()
+            return repr(e) or e.__class__.__name__
+
+        OUTBOX_DELIVERIES.labels(row.name, 'delivered').inc()
+        OUTBOX_DELIVERY_LAG.observe((datetime.now(timezone.utc) - row.created_at).total_seconds())
+        return None
+
+    async def _settle(self, session: AsyncSession, results: list[tuple]):
+        delivered = [row.id for row, error in results if error is None]
+        if delivered:
+            await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(delivered)))
+            self.delivered += len(delivered)
+
+        retries, deferred = [], []
+        retry_at_of = {}
+        now = datetime.now(timezone.utc)
+        for row, error in results:
+            if error is None:
+                continue
+            if error is False:
+                # behind a failed message of the same aggregate, results keep the delivery order
+                deferred.append({'b_message_id': row.id, 'retry_at': retry_at_of[row.aggregate_id]})
+                continue
+
+            self.failed += 1
+            retry_at = None
+            if row.attempts + 1 < self.max_attempts:
+                retry_at = now + timedelta(seconds=min(self.backoff * 2 ** row.attempts, self.max_backoff))
+            else:
+                self.parked += 1
+                logger.error('Outbox message %s (%s) parked after %d attempts', row.id, row.name, row.attempts + 1)
+            retry_at_of[row.aggregate_id] = retry_at
+            retries.append({'b_message_id': row.id, 'retry_at': retry_at, 'error': error[:1000]})
+        if retries:
+            await session.execute(reschedule_stmt, retries)
+        if deferred:
+            await session.execute(defer_stmt, deferred)
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Hashable
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+Subscriber = Callable[[Any], None]
+
+
+class EventHub:
+
+    def __init__(self):
+        self._subscribers: dict[Hashable, set[Subscriber]] = defaultdict(set)
+
+    def subscribe(self, key: Hashable, callback: Subscriber):
+        self._subscribers[key].add(callback)
+
+    def unsubscribe(self, key: Hashable, callback: Subscriber):
+        callbacks = self._subscribers.get(key)
+        if callbacks is None:
+            return
+
+        callbacks.discard(callback)
+        if not callbacks:
+            del self._subscribers[key]
+
+    @contextmanager
+    def subscription(self, key: Hashable, maxsize: int = 100) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize)
+
+        def put(message):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+        self.subscribe(key, put)
+        try:
+            yield queue
+        finally:
+            self.unsubscribe(key, put)
+
+    def publish(self, key: Hashable, message: Any):
+        for callback in tuple(self._subscribers.get(key, ())):
+            try:
+                callback(message)
+            except Exception:
+                logger.exception('Subscriber of %s failed', key)
+
+    def __len__(self):
+        return sum(len(x) for x in self._subscribers.values())
+
+
+class PgNotifyListener:
+    """Keeps a dedicated connection LISTENing on a channel and reconnects on failure.
+
+    NOTIFY is transactional in Postgres, so the handler only ever sees payloads
+    of committed transactions, in every worker process that listens.
+    Notifications sent while the connection is down are lost; ``on_connect``
+    runs once LISTEN is in place, which is the moment to catch up on state.
+    """
+
+    def __init__(self, dsn: str, channel: str, handler: Callable[[str], None],
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0,
+                 on_connect: Callable[[asyncpg.Connection], Awaitable[None]] | None = None):
+        self._dsn = dsn
+        self._channel = channel
+        self._handler = handler
+        self._on_connect = on_connect
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._task: asyncio.Task | None = None
+        self._ready = asyncio.Event()
+
+    async def start(self, timeout: float = 5.0):
+        if self._task is not None:
+            return
+
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning('LISTEN %s is not established yet, retrying in background', self._channel)
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._ready.clear()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            self._handler(payload)
+        except Exception:
+            logger.exception('Unable to handle notification on %s', channel)
+
+    async def _run(self):
+        delay = self._reconnect_delay
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self._dsn)
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _: closed.set())
+                await conn.add_listener(self._channel, self._on_notify)
+                if self._on_connect is not None:
+                    await self._on_connect(conn)
+
+                self._ready.set()
+                delay = self._reconnect_delay
+                await closed.wait()
+                logger.warning('LISTEN connection for %s was closed', self._channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('LISTEN %s failed, reconnecting in %.1fs', self._channel, delay)
+            finally:
+                self._ready.clear()
+                if conn is not None and not conn.is_closed():
+                    await conn.close(timeout=1)
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_reconnect_delay)
@@ -0,0 +1,65 @@
+import asyncio
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+lag_stmt = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+    END
+""")
+
+
+class ReplicaMonitor:
+
+    def __init__(self, engine: AsyncEngine, max_lag: float, interval: float = 1.0):
+        self._engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self.lag: float | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.lag is not None and self.lag <= self.max_lag
+
+    @property
+    def stats(self) -> dict:
+        return {'lag_seconds': self.lag if self.lag is not None else float('nan'),
+                'healthy': int(self.healthy)}
+
+    async def check(self):
+        try:
+            async with self._engine.connect() as conn:
+                self.lag = float((await conn.execute(lag_stmt)).scalar())
+        except Exception:
+            if self.lag is not None:
+                logger.exception('Replica is unreachable, reads fall back to the primary')
+            self.lag = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check()
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+_abandoned = object()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller runs the call, callers arriving while it is in flight
+    await the same result, or the same exception. ``not_before`` (a
+    ``time.time()`` value, so that commit times recorded by other processes
+    compare) keeps a caller from joining a flight that started earlier, e.g.
+    before its own last commit: such a caller starts a new flight, which
+    later callers join instead. If the leader is cancelled,
+    its followers retry rather than inherit the cancellation.
+
+    Results are shared objects, callers must not modify them.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, tuple[float, asyncio.Future]] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    @property
+    def stats(self) -> dict:
+        return {'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights)}
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]], not_before: float | None = None) -> Any:
+        while (flight := self._flights.get(key)) is not None and (not_before is None or flight[0] >= not_before):
+            # shielded: a follower being cancelled must not cancel the result other callers wait for
+            try:
+                result = await asyncio.shield(flight[1])
+            except Exception:
+                self.coalesced += 1
+                raise
+            if result is not _abandoned:
+                self.coalesced += 1
+                return result
+
+        future = asyncio.get_running_loop().create_future()
+        flight = (time.time(), future)
+        self._flights[key] = flight
+        self.executed += 1
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.set_result(_abandoned)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # mark it retrieved, there may be no followers to do it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+Warmup = Callable[[AsyncSession], Awaitable]
+
+
+class StartupTimer:
+    """Wall time of each startup phase, in the order the phases ran."""
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    @property
+    def stats(self) -> dict:
+        return {**{f'{name}_seconds': x for name, x in self.phases.items()}, 'total_seconds': self.total}
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started_at)
+
+    def report(self):
+        logger.info('Started in %.3fs: %s', self.total,
+                    ', '.join(f'{name} {x * 1000:.1f}ms' for name, x in self.phases.items()))
+
+
+async def warm_pool(engine: AsyncEngine, connections: int, warmups: Sequence[Warmup] = ()) -> int:
+    """Opens up to ``connections`` pooled connections at once and runs ``warmups`` on each.
+
+    asyncpg prepares a statement per connection the first time it runs and
+    SQLAlchemy caches the prepared statement by its SQL, so running the hot
+    queries here means the first requests skip both connection setup and
+    preparation. Warmups must only read, they run in a rolled back transaction.
+    Connections above the pool size would be closed on release, so the count
+    is capped there.
+    """
+    connections = min(connections, engine.pool.size())
+    if connections <= 0:
+        return 0
+
+    async def open_one():
+        async with engine.connect() as conn:
+            async with AsyncSession(bind=conn) as session:
+                for warmup in warmups:
+                    await warmup(session)
+                await session.rollback()
+
+    results = await asyncio.gather(*(open_one() for _ in range(connections)), return_exceptions=True)
+    failed = [x for x in results if isinstance(x, BaseException)]
+    for error in failed[:1]:
+        logger.warning('Pool warmup failed on %d of %d connections: %r', len(failed), connections, error)
+    return connections - len(failed)
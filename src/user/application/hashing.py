@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from exceptions import ServiceOverloadedError
+from .utils import crypt_context
+
+PASSWORD_HASHER_WORKERS = int(os.getenv('PASSWORD_HASHER_WORKERS', 2))
+PASSWORD_HASHER_QUEUE = int(os.getenv('PASSWORD_HASHER_QUEUE', 32))
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated thread pool so it never blocks the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    At most ``max_workers + max_queue`` calls are admitted, the rest fail fast.
+    """
+
+    def __init__(self, max_workers: int = PASSWORD_HASHER_WORKERS, max_queue: int = PASSWORD_HASHER_QUEUE):
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending = 0
+
+        self.calls = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_run_seconds = 0.0
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(crypt_context.verify, password, hashed)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(crypt_context.hash, password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def stats(self) -> dict:
+        return {'calls': self.calls,
+                'rejected': self.rejected,
+                'pending': self._pending,
+                'wait_seconds': self.wait_seconds,
+                'run_seconds': self.run_seconds,
+                'max_run_seconds': self.max_run_seconds}
+
+    async def _run(self, fn: Callable, *args):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise ServiceOverloadedError()
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='password-hasher')
+
+        self._pending += 1
+        queued_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started_at, finished_at = await loop.run_in_executor(self._executor, _timed, fn, args)
+        finally:
+            self._pending -= 1
+
+        run_seconds = finished_at - started_at
+        self.calls += 1
+        self.wait_seconds += started_at - queued_at
+        self.run_seconds += run_seconds
+        self.max_run_seconds = max(self.max_run_seconds, run_seconds)
+
+        return result
+
+
+def _timed(fn: Callable, args: tuple):
+    started_at = time.perf_counter()
+    result = fn(*args)
+    return result, started_at, time.perf_counter()
+
+
+password_hasher = PasswordHasher()
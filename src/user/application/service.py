@@ -1,14 +1,24 @@
+import os
+import time
+
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import ExpiredSignatureError, JWTError
 
 from user.infra.repository import UserRepository
 from user.domain.entity import AuthorizedUserEntity
-from .utils import generate_jwt_token, decode_token
+from .utils import create_jwt_token, decode_token
+from .hashing import password_hasher
 from exceptions import UserIsInactive, BadCredentialsError, DecodeTokenError, NoPermissionByRole
+from shared.infra.cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer('token')
 
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_MAX_TTL = float(os.getenv('TOKEN_CACHE_MAX_TTL', 3600))
+
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_MAX_TTL)
+
 
 class UserService:
 
@@ -23,24 +33,34 @@ class UserService:
         if user.is_active is False:
             raise UserIsInactive
 
-        token = generate_jwt_token(password, user)
-
-        if token is None:
+        if not await password_hasher.verify(password, user.password):
             raise BadCredentialsError()
-        return token
+
+        return create_jwt_token(user)
 
     @staticmethod
-    def get_user_from_token(token: str = Depends(oauth2_scheme)) -> AuthorizedUserEntity:
+    async def get_user_from_token(token: str = Depends(oauth2_scheme)) -> AuthorizedUserEntity:
+        user = token_cache.get(token)
+        if user is not None:
+            return user
+
         try:
             data = decode_token(token)
-            return AuthorizedUserEntity(id=data.get('id'),
-                                        username=data.get('username'),
-                                        role=data.get('role'))
         except ExpiredSignatureError:
             raise DecodeTokenError('Authorization token has expired')
         except JWTError:
             raise DecodeTokenError('Invalid token authorization')
 
+        user = AuthorizedUserEntity(id=data.get('id'),
+                                    username=data.get('username'),
+                                    role=data.get('role'))
+        ttl = TOKEN_CACHE_MAX_TTL
+        if 'exp' in data:
+            ttl = min(ttl, data['exp'] - time.time())
+        token_cache.set(token, user, ttl)
+
+        return user
+
     @staticmethod
     def is_rw_access(user: AuthorizedUserEntity) -> bool:
         if user.verify_admin_access() or user.verify_moderator_access():
@@ -10,16 +10,15 @@ ALGORITHM = 'HS256'
 crypt_context = CryptContext(['bcrypt'])
 
 
-def generate_jwt_token(input_password: str, user: UserEntity) -> str | None:
-    if crypt_context.verify(input_password, user.password):
-        data = {
-            'id': str(user.id),
-            'username': user.username,
-            'role': user.role.value
-        }
-        expire = datetime.utcnow() + timedelta(weeks=1)
-        data['exp'] = expire
-        return jwt.encode(data, SECRET_KEY, ALGORITHM)
+def create_jwt_token(user: UserEntity) -> str:
+    data = {
+        'id': str(user.id),
+        'username': user.username,
+        'role': user.role.value
+    }
+    expire = datetime.utcnow() + timedelta(weeks=1)
+    data['exp'] = expire
+    return jwt.encode(data, SECRET_KEY, ALGORITHM)
 
 
 def decode_token(token: str) -> dict:
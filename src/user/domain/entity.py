@@ -18,6 +18,8 @@ class Role:
             value = RoleName.MODERATOR
         elif role_id == 3:
             value = RoleName.CUSTOMER
+        elif role_id == 4:
+            value = RoleName.COURIER
 
         return cls(id=role_id, value=value)
 
@@ -33,6 +35,9 @@ class AuthorizedUserEntity(Entity):
     def verify_moderator_access(self) -> bool:
         return self.role == RoleName.MODERATOR
 
+    def verify_courier_access(self) -> bool:
+        return self.role == RoleName.COURIER
+
 
 @dataclass
 class UserEntity(AuthorizedUserEntity):
@@ -5,3 +5,4 @@ class RoleName(str, Enum):
     CUSTOMER = 'CUSTOMER'
     ADMIN = 'ADMIN'
     MODERATOR = 'MODERATOR'
+    COURIER = 'COURIER'
@@ -0,0 +1,70 @@
+"""The memory-mapped catalog snapshot must answer like the repository queries it stands in for."""
+import asyncio
+import os
+from uuid import uuid4
+
+import pytest
+
+from products.infra.snapshot import SnapshotReader, encode
+
+
+def read(tmp_path, data: bytes) -> SnapshotReader:
+    path = tmp_path / 'catalog.snap'
+    path.write_bytes(data)
+    with open(path, 'rb') as f:
+        return SnapshotReader(f.fileno())
+
+
+def test_products_without_a_category_are_left_out(tmp_path):
+    categorized, uncategorized = uuid4(), uuid4()
+    reader = read(tmp_path, encode(3, [(categorized, 'roll', 10.0, 'sushi'),
+                                       (uncategorized, 'orphan', 5.0, None)], ['sushi', 'empty']))
+
+    assert reader.products == 1
+    assert reader.get_product(uncategorized) is None
+    assert reader.get_product(categorized).category_name == 'sushi'
+    assert [x.id for x in reader.get_category('sushi')] == [categorized]
+    assert reader.get_category('empty') == []
+    reader.close()
+
+
+@pytest.mark.skipif(not os.getenv('POSTGRES_DB'), reason='needs a migrated database, see db_config')
+def test_snapshot_and_repository_agree_on_a_product_with_null_category(tmp_path):
+    from sqlalchemy import delete, insert
+
+    from db_config import SessionInst, engine
+    from models import Category, Product
+    from products.infra.repository import ProductRepository
+    from products.infra.snapshot import CatalogSnapshot
+
+    category_id, categorized, uncategorized = uuid4(), uuid4(), uuid4()
+
+    async def run():
+        # committed, the snapshot reads in a REPEATABLE READ transaction of its own
+        async with engine.begin() as conn:
+            await conn.execute(insert(Category).values(id=category_id, category_name=f'test-{category_id}'))
+            await conn.execute(insert(Product).values(id=categorized, product_name='roll',
+                                                      category_id=category_id, price=10))
+            await conn.execute(insert(Product).values(id=uncategorized, product_name='orphan',
+                                                      category_id=None, price=5))
+        try:
+            async with SessionInst() as session:
+                repository = ProductRepository(session)
+                from_db = {x: await repository.get_by_id(x, cached=False) for x in (categorized, uncategorized)}
+                many = {x.id for x in await repository.get_many_by_ids([categorized, uncategorized])}
+
+            version, products, categories = await CatalogSnapshot(str(tmp_path / 'catalog.snap'))._load()
+        finally:
+            async with engine.begin() as conn:
+                await conn.execute(delete(Product).where(Product.id.in_([categorized, uncategorized])))
+                await conn.execute(delete(Category).where(Category.id == category_id))
+            await engine.dispose()
+        return from_db, many, read(tmp_path, encode(version, products, categories))
+
+    from_db, many, reader = asyncio.run(run())
+
+    assert from_db[uncategorized] is None
+    assert reader.get_product(uncategorized) is None
+    assert many == {categorized}
+    assert reader.get_product(categorized) == from_db[categorized]
+    reader.close()
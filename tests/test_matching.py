@@ -0,0 +1,145 @@
+"""Courier matching and the grid index checked against brute force on small random inputs."""
+import random
+from itertools import permutations
+from math import inf, isclose
+
+import pytest
+
+from delivery.application.matching import hungarian, match_greedy, match_optimal
+from delivery.domain.geo import Point, haversine_km
+from delivery.infra.spatial import GridIndex
+
+
+def city_point(rng: random.Random, center=(55.75, 37.62), spread=(0.05, 0.08)) -> Point:
+    return Point(center[0] + rng.uniform(-spread[0], spread[0]), center[1] + rng.uniform(-spread[1], spread[1]))
+
+
+def build_index(points: dict, cell_degrees: float = 0.01) -> GridIndex:
+    index = GridIndex(cell_degrees)
+    for key, point in points.items():
+        index.update(key, point.latitude, point.longitude)
+    return index
+
+
+def brute_nearest(points: dict, point: Point, k: int, max_km: float, exclude=()) -> list:
+    found = [(key, haversine_km(point.latitude, point.longitude, x.latitude, x.longitude))
+             for key, x in points.items() if key not in exclude]
+    return sorted((x for x in found if x[1] <= max_km), key=lambda x: x[1])[:k]
+
+
+def best_assignment(orders: list, proposals: list[dict], couriers: list) -> tuple[int, float]:
+    """Most orders matched within their proposals, then the shortest total distance."""
+    best = (0, 0.0)
+    slots = couriers + [None] * len(orders)
+    for chosen in set(permutations(slots, len(orders))):
+        pairs = [proposals[i][x] for i, x in enumerate(chosen) if x is not None and x in proposals[i]]
+        if (len(pairs), -sum(pairs)) > (best[0], -best[1]):
+            best = (len(pairs), sum(pairs))
+    return best
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_hungarian_finds_the_minimum_cost(seed):
+    rng = random.Random(seed)
+    rows = rng.randint(1, 5)
+    columns = rng.randint(rows, 6)
+    cost = [[rng.choice((rng.uniform(0, 10), rng.randint(0, 3))) for _ in range(columns)] for _ in range(rows)]
+
+    result = hungarian(cost)
+
+    assert len(set(result)) == rows
+    expected = min(sum(cost[i][j] for i, j in enumerate(x)) for x in permutations(range(columns), rows))
+    assert isclose(sum(cost[i][j] for i, j in enumerate(result)), expected, abs_tol=1e-9)
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('cell_degrees', [0.002, 0.01, 0.05])
+def test_nearest_matches_brute_force(seed, cell_degrees):
+    rng = random.Random(seed)
+    points = {f'c{i}': city_point(rng) for i in range(rng.randint(1, 300))}
+    index = build_index(points, cell_degrees)
+    exclude = set(rng.sample(sorted(points), len(points) // 5))
+
+    for _ in range(20):
+        # some queries land outside the occupied area, where lookups fall back to scanning cells
+        query = city_point(rng, spread=(0.2, 0.3))
+        k = rng.randint(1, 8)
+        max_km = rng.choice((inf, rng.uniform(0.5, 5)))
+
+        found = index.nearest(query.latitude, query.longitude, k, max_km, exclude)
+
+        expected = brute_nearest(points, query, k, max_km, exclude)
+        assert [x[0] for x in found] == [x[0] for x in expected]
+        assert all(isclose(a[1], b[1]) for a, b in zip(found, expected))
+
+
+def test_nearest_far_from_the_equator():
+    rng = random.Random(7)
+    points = {f'c{i}': city_point(rng, center=(78.2, 15.6), spread=(0.05, 0.4)) for i in range(200)}
+    index = build_index(points)
+
+    for _ in range(50):
+        query = city_point(rng, center=(78.2, 15.6), spread=(0.05, 0.4))
+        found = index.nearest(query.latitude, query.longitude, 3)
+
+        expected = brute_nearest(points, query, 3, inf)
+        assert [x[0] for x in found] == [x[0] for x in expected]
+
+
+def test_nearest_follows_moves_and_removals():
+    index = build_index({'a': Point(55.75, 37.6), 'b': Point(55.76, 37.6)})
+    index.update('a', 55.9, 37.9)
+    index.remove('b')
+
+    assert [x[0] for x in index.nearest(55.75, 37.6, 2)] == ['a']
+    assert index.position('a') == Point(55.9, 37.9)
+    assert index.nearest(55.75, 37.6, 1, exclude={'a'}) == []
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_optimal_match_matches_brute_force(seed):
+    rng = random.Random(seed)
+    couriers = {f'c{i}': city_point(rng) for i in range(rng.randint(1, 6))}
+    # more orders than couriers exercises the transposed cost matrix
+    orders = [(f'o{i}', city_point(rng)) for i in range(rng.randint(1, 6))]
+    busy = set(rng.sample(sorted(couriers), rng.randint(0, len(couriers) - 1)))
+    candidates = rng.randint(1, len(couriers))
+    max_km = rng.choice((inf, rng.uniform(2, 8)))
+    index = build_index(couriers)
+
+    assigned = match_optimal(orders, index, busy, candidates, max_km)
+
+    proposals = [dict(brute_nearest(couriers, point, candidates, max_km, busy)) for _, point in orders]
+    chosen = [x[0] for x in assigned.values()]
+    assert len(chosen) == len(set(chosen))
+    assert not busy & set(chosen)
+    for i, (order_id, _) in enumerate(orders):
+        if order_id in assigned:
+            courier_id, km = assigned[order_id]
+            assert isclose(proposals[i][courier_id], km)
+
+    free = [x for x in couriers if x not in busy]
+    count, total = best_assignment(orders, proposals, free)
+    assert len(assigned) == count
+    assert isclose(sum(km for _, km in assigned.values()), total, abs_tol=1e-9)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_greedy_match_is_a_valid_assignment(seed):
+    rng = random.Random(seed)
+    couriers = {f'c{i}': city_point(rng) for i in range(rng.randint(1, 30))}
+    orders = [(f'o{i}', city_point(rng)) for i in range(rng.randint(1, 30))]
+    busy = set(rng.sample(sorted(couriers), len(couriers) // 4))
+    index = build_index(couriers)
+
+    assigned = match_greedy(orders, index, busy, candidates=3)
+
+    chosen = [x[0] for x in assigned.values()]
+    assert len(chosen) == len(set(chosen))
+    assert not busy & set(chosen)
+    # every order is matched while free couriers remain
+    assert len(assigned) == min(len(orders), len(couriers) - len(busy))
+    points = dict(orders)
+    for order_id, (courier_id, km) in assigned.items():
+        point, courier = points[order_id], couriers[courier_id]
+        assert isclose(km, haversine_km(point.latitude, point.longitude, courier.latitude, courier.longitude))
@@ -0,0 +1,58 @@
+"""Tracking sockets start from a snapshot that must hold every event notified before they subscribed."""
+import asyncio
+import json
+from types import SimpleNamespace
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.websockets import WebSocket
+
+import db_config
+from api.routers.orders import websocket_endpoint
+from orders.application.query import OrderQueries
+from orders.infra.notifier import dispatch_order_event
+
+
+def event(name: str) -> dict:
+    return {'id': str(uuid4()), 'name': name, 'created_at': '2026-10-18T12:00:00+00:00'}
+
+
+def test_snapshot_holds_an_event_notified_before_connect(monkeypatch):
+    order_id = uuid4()
+    ready = event('ReadyToDelivery')
+    history = [event('CreateNewOrder'), event('StartOrder'), ready]
+
+    # a healthy replica that has not replayed the last commit yet
+    replica = create_async_engine('postgresql+asyncpg://replica/delivery_db')
+    monkeypatch.setattr(db_config, 'read_engine', replica)
+    monkeypatch.setattr(db_config, 'ReadSessionInst', async_sessionmaker(bind=replica))
+    monkeypatch.setattr(db_config, 'replica_monitor', SimpleNamespace(healthy=True))
+
+    coalesced = OrderQueries.get_statuses
+
+    async def get_statuses(self, _id, coalesce=False, since=None):
+        if coalesce:
+            return await coalesced(self, _id, coalesce, since)
+        return list(history if self._db.bind is db_config.engine else history[:-1])
+
+    monkeypatch.setattr(OrderQueries, 'get_statuses', get_statuses)
+
+    sent = []
+    incoming = [{'type': 'websocket.connect'}, {'type': 'websocket.disconnect', 'code': 1000}]
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        # committed and notified while nobody watched the order, only the snapshot can carry it
+        dispatch_order_event(json.dumps({'order_id': str(order_id), **ready}))
+        scope = {'type': 'websocket', 'path': f'/orders/{order_id}/ws', 'headers': [], 'query_string': b''}
+        await websocket_endpoint(order_id, WebSocket(scope, receive, send))
+
+    asyncio.run(run())
+
+    assert sent[0]['type'] == 'websocket.accept'
+    assert json.loads(sent[1]['text']) == history